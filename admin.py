@@ -0,0 +1,28 @@
+import hmac
+import os
+from functools import wraps
+
+from flask import request, jsonify
+
+# Debug endpoints are disabled unless an admin token is configured
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+
+def _presented_token() -> str:
+    token = request.headers.get('X-Admin-Token', '')
+    auth = request.headers.get('Authorization', '')
+    if not token and auth.startswith('Bearer '):
+        token = auth[len('Bearer '):]
+    return token
+
+
+def require_admin(view):
+    """Restrict a route to callers presenting ADMIN_TOKEN."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({'error': 'Not found'}), 404
+        if not hmac.compare_digest(_presented_token().encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+            return jsonify({'error': 'Admin token required'}), 403
+        return view(*args, **kwargs)
+    return wrapper
@@ -1,15 +1,39 @@
-from flask import Flask, jsonify, request, render_template
+import time
+
+# Recorded first so the import-time breakdown covers the whole module
+BOOT_STARTED = time.perf_counter()
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file if it exists, before the modules
+# below read their configuration
+load_dotenv()
+
+from flask import Flask, jsonify, request, render_template, Response, stream_with_context, g
 from flask_cors import CORS
 from topic_manager import get_random_topic
 from question_generator import generate_dsa_question
-from codeCompiler import compile_code
+from codeCompiler import compile_code, check_code_locally
 from submitCode import submit_code
+from circuit_breaker import CircuitOpenError, get_breaker
+import circuit_breaker
+import job_queue
+import question_store
+import report_store
+import topic_sampler
+from rate_limiter import client_id, rate_limited
+import batch_grader
+import metrics
+import tracing
+from admin import require_admin
+import profiler
+import run_scheduler
+import sandbox
+import warmup
+from prompt_builder import PromptTooLargeError
+import json
 import os
 import traceback
-from dotenv import load_dotenv
-
-# Load environment variables from .env file if it exists
-load_dotenv()
 
 # Create Flask app
 app = Flask(__name__)
@@ -20,6 +44,14 @@ CORS(app, resources={r"/*": {"origins": "*"}})
 
 # Constants
 TOPICS_FILE = os.getenv('TOPICS_FILE', 'dsa_topics.txt')
+SUBMIT_MODE = os.getenv('SUBMIT_MODE', 'sync')  # 'sync' or 'job'
+# Whether /submit responses include the full report or only its report_id
+SUBMIT_INLINE_REPORT = os.getenv('SUBMIT_INLINE_REPORT', 'true').lower() in ('1', 'true', 'yes')
+
+def _log_error(where, error_details):
+    """Log a handled error and count it."""
+    print(f"Error in {where}: {error_details}")
+    metrics.app_errors.inc(route=where)
 
 def read_topics():
     """Read all topics from the topics file."""
@@ -50,8 +82,48 @@ def write_topics(topics):
         return False
 
 
+def _job_options(body):
+    """Validated (priority, webhook_url) for a queued submission; raises ValueError."""
+    priority = body.get('priority', 0)
+    if isinstance(priority, bool) or not isinstance(priority, (int, str)):
+        raise ValueError('priority must be an integer.')
+    try:
+        priority = int(priority)
+    except ValueError:
+        raise ValueError('priority must be an integer.')
+    if not job_queue.MIN_PRIORITY <= priority <= job_queue.MAX_PRIORITY:
+        raise ValueError(f'priority must be between {job_queue.MIN_PRIORITY} and {job_queue.MAX_PRIORITY}.')
+    webhook_url = body.get('webhook_url')
+    if webhook_url is not None:
+        if not isinstance(webhook_url, str):
+            raise ValueError('webhook_url must be a string.')
+        job_queue.validate_webhook_url(webhook_url)
+    return priority, webhook_url
+
+
+def _queue_degraded_submission(payload):
+    """Queue a submission the grader can't take right now and respond with 202."""
+    try:
+        priority, webhook_url = _job_options(request.json)
+    except ValueError as e:
+        return jsonify({
+            'result': 'Failure',
+            'message': str(e)
+        }), 400
+    # Held back until the breaker would next let a call through
+    job_id = job_queue.enqueue(payload, priority=priority, webhook_url=webhook_url,
+                               delay=circuit_breaker.BREAKER_OPEN_SECONDS)
+    return jsonify({
+        'job_id': job_id,
+        'status': 'Queued for grading',
+        'status_url': f'/submit/{job_id}',
+        'markdown_report': '## ⏳ Queued for Grading\n\nThe grader is busy right now. '
+                           'Your submission has been queued and will be evaluated shortly.',
+        'degraded': True
+    }), 202
 
 @app.route('/submit', methods=['POST'])
+@rate_limited('submit')
 def submit():
     """Handle code submission and evaluation."""
     if not request.is_json:
@@ -76,15 +148,84 @@ def submit():
                 'message': 'Missing required fields in submission.'
             }), 400
 
+        # Grade against the stored reference solution in the submitted language
+        referenceLanguage = None
+        question_id = request.json.get('question_id')
+        if question_id:
+            reference = question_store.get_reference_solution(question_id, typedLanguage)
+            if reference:
+                actualSolution, referenceLanguage = reference
+            elif not actualSolution:
+                return jsonify({
+                    'result': 'Failure',
+                    'message': f"Question '{question_id}' is not stored. Send actualSolution with the submission."
+                }), 404
+            else:
+                print(f"Question {question_id} is not stored; grading against the submitted actualSolution")
+
+        payload = {
+            'actualSolution': actualSolution,
+            'description': description,
+            'typedSolution': typedSolution,
+            'typedLanguage': typedLanguage,
+            'referenceLanguage': referenceLanguage
+        }
+        # In job mode, queue the evaluation and return immediately
+        mode = request.json.get('mode') or request.args.get('mode') or SUBMIT_MODE
+        if mode == 'job':
+            try:
+                priority, webhook_url = _job_options(request.json)
+            except ValueError as e:
+                return jsonify({
+                    'result': 'Failure',
+                    'message': str(e)
+                }), 400
+            job_id = job_queue.enqueue(payload, priority=priority, webhook_url=webhook_url)
+            return jsonify({
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': f'/submit/{job_id}'
+            }), 202
+
+        # While the grader is degraded, queue the submission instead of waiting on it
+        if get_breaker('submit').is_open():
+            return _queue_degraded_submission(payload)
+
         # Pass the code to submit_code function
         # Processing code submission
-        result = submit_code(typedSolution, description, typedSolution, typedLanguage)
+        try:
+            # Errors are raised so an unreachable grader isn't reported as a grade
+            result = submit_code(raise_errors=True, **payload)
+        except CircuitOpenError:
+            # The breaker opened (or a half-open probe is in flight) since the check above
+            return _queue_degraded_submission(payload)
+        except Exception as e:
+            if not job_queue.is_outage_error(e):
+                raise
+            _log_error('submit', traceback.format_exc())
+            return jsonify({
+                'result': 'Failure',
+                'message': 'The grader is temporarily unavailable. Please resubmit shortly.',
+                'degraded': True
+            }), 503
+
+        # Stored reports can be fetched separately instead of sent inline
+        if result.get('report_id'):
+            result['report_url'] = f"/reports/{result['report_id']}"
+            if not request.json.get('inline_report', SUBMIT_INLINE_REPORT):
+                del result['markdown_report']
 
         # Check the result and respond accordingly
         return jsonify(result)
 
+    except PromptTooLargeError as e:
+        return jsonify({
+            'result': 'Failure',
+            'message': str(e)
+        }), 413
     except Exception as e:
         error_details = traceback.format_exc()
+        _log_error('submit', error_details)
         # Error in code submission
         return jsonify({
             'result': 'Failure',
@@ -92,7 +233,92 @@ def submit():
         }), 500
 
 
+@app.route('/submit/batch', methods=['POST'])
+@rate_limited('submit_batch')
+def submit_batch():
+    """Grade many submissions concurrently and stream results as NDJSON."""
+    if not request.is_json:
+        return jsonify({
+            'result': 'Failure',
+            'message': 'Invalid request format. JSON required.'
+        }), 400
+
+    items = request.json.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({
+            'result': 'Failure',
+            'message': 'A non-empty list of items is required.'
+        }), 400
+    if len(items) > batch_grader.BATCH_MAX_ITEMS:
+        return jsonify({
+            'result': 'Failure',
+            'message': f'A batch may contain at most {batch_grader.BATCH_MAX_ITEMS} items.'
+        }), 413
+
+    # Don't start a batch that would only collect grader errors
+    if get_breaker('submit').is_open():
+        response = jsonify({
+            'result': 'Failure',
+            'message': 'The grader is temporarily unavailable. Please retry the batch shortly.',
+            'degraded': True
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(int(circuit_breaker.BREAKER_OPEN_SECONDS))
+        return response
+
+    def generate():
+        for result in batch_grader.grade_batch(items):
+            yield json.dumps(result) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/submit/<job_id>', methods=['GET'])
+def submit_status(job_id):
+    """Poll the state of a queued submission."""
+    try:
+        job = job_queue.get_job(job_id)
+        if job is None:
+            return jsonify({
+                'result': 'Failure',
+                'message': f"Job '{job_id}' not found."
+            }), 404
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({
+            'result': 'Failure',
+            'message': f'Error while fetching job: {str(e)}'
+        }), 500
+
+
+@app.route('/reports/<report_id>', methods=['GET'])
+def get_report(report_id):
+    """Serve a stored submission report, compressed if the client accepts it."""
+    stored = report_store.load(report_id)
+    if stored is None:
+        return jsonify({
+            'result': 'Failure',
+            'message': f"Report '{report_id}' not found."
+        }), 404
+    data, encoding = stored
+
+    # Reports are content-addressed, so the id is a strong validator and never changes
+    headers = {
+        'ETag': f'"{report_id}"',
+        'Cache-Control': 'public, max-age=31536000, immutable',
+        'Vary': 'Accept-Encoding'
+    }
+    if request.if_none_match.contains_weak(report_id):
+        return Response(status=304, headers=headers)
+    if request.accept_encodings[encoding]:
+        headers['Content-Encoding'] = encoding
+    else:
+        data = report_store.decompress(data, encoding)
+    return Response(data, mimetype='text/markdown', headers=headers)
+
+
 @app.route('/compiler', methods=['POST'])
+@rate_limited('compiler')
 def compile():
     """Compile and run code."""
     if not request.is_json:
@@ -115,39 +341,127 @@ def compile():
                 'message': 'Both language and code are required.'
             }), 400
 
+        # Fall back to a local check while the compiler model is degraded
+        if get_breaker('compile').is_open():
+            return jsonify(check_code_locally(code, lang))
+
         # Pass the code to compile_code function
         # Compiling code
-        result = compile_code(code, lang)
+        try:
+            result = compile_code(code, lang)
+        except CircuitOpenError:
+            result = check_code_locally(code, lang)
 
         # Check the result and respond accordingly
         return jsonify(result)
 
+    except PromptTooLargeError as e:
+        return jsonify({
+            'result': 'Failure',
+            'message': str(e)
+        }), 413
     except Exception as e:
         error_details = traceback.format_exc()
+        _log_error('compile', error_details)
         # Error during compilation
         return jsonify({
             'result': 'Failure',
             'message': f'Error while compiling: {str(e)}'
         }), 500
 
+@app.route('/compiler/run', methods=['POST'])
+@rate_limited('compiler_run')
+def compile_run():
+    """Run code locally, streaming its output as server-sent events."""
+    if not sandbox.LOCAL_EXECUTION_ENABLED:
+        return jsonify({
+            'result': 'Failure',
+            'message': 'Local execution is disabled.'
+        }), 404
+    if not request.is_json:
+        return jsonify({
+            'result': 'Failure',
+            'message': 'Invalid request format. JSON required.'
+        }), 400
+
+    lang = request.json.get('lang')
+    code = request.json.get('code')
+    stdin = request.json.get('stdin') or ''
+    if not lang or not code or code.isspace():
+        return jsonify({
+            'result': 'Failure',
+            'message': 'Both language and code are required.'
+        }), 400
+    if not sandbox.supports(lang):
+        return jsonify({
+            'result': 'Failure',
+            'message': f"Running {lang} code is not available on this server."
+        }), 400
+    if not isinstance(stdin, str) or len(stdin.encode('utf-8')) > sandbox.RUN_MAX_INPUT_BYTES:
+        return jsonify({
+            'result': 'Failure',
+            'message': f'Input must be a string of at most {sandbox.RUN_MAX_INPUT_BYTES} bytes.'
+        }), 413
+
+    # Runs are scheduled fairly across API keys (or client addresses)
+    tenant = client_id()
+
+    # Clients that can't read an event stream get the capped result in one response
+    if request.json.get('stream', True) is False:
+        return jsonify(sandbox.run_to_completion(code, lang, stdin, tenant=tenant))
+
+    def generate():
+        for event in sandbox.run_code(code, lang, stdin, tenant=tenant):
+            name = event.pop('event')
+            yield f'event: {name}\ndata: {json.dumps(event)}\n\n'
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _degraded_question(topic):
+    """Respond with a pooled question, or 503 if none has been generated yet."""
+    question = question_store.get_random_question(topic)
+    if question is None:
+        return jsonify({
+            'error': 'Question generation is temporarily unavailable. Please try again shortly.'
+        }), 503
+    return jsonify(dict(question, degraded=True))
+
 @app.route('/get_dsa_question', methods=['GET'])
+@rate_limited('get_dsa_question')
 def get_dsa_question():
     """Generate a random DSA question based on a topic."""
     try:
         # Get a random topic from Firebase
-        topic = get_random_topic()
+        with tracing.span('topic.select'):
+            topic = get_random_topic()
         if not topic:
             # No topics found in Firestore
             return jsonify({
                 'error': 'No topics available. Please add topics first.'
             }), 404
             
+        # Serve a previously generated question while the generator is degraded
+        if get_breaker('generate').is_open():
+            return _degraded_question(topic)
+
+        # Topics with enough distinct questions are served from the pool
+        if question_store.is_topic_full(topic):
+            return jsonify(question_store.get_random_question(topic))
+
         # Generate DSA question using the selected topic
-        result = generate_dsa_question(topic)
+        try:
+            result = generate_dsa_question(topic)
+        except CircuitOpenError:
+            return _degraded_question(topic)
+        # Near-duplicates of stored questions come back with their question_id and stay filed
+        # under the topic they were generated for
+        if not result.get('question_id'):
+            result['question_id'] = question_store.add_question(topic, result)
         return jsonify(result)
     except Exception as e:
         error_details = traceback.format_exc()
-        print(f"Error in get_dsa_question: {error_details}")
+        _log_error('get_dsa_question', error_details)
         # Error generating DSA question
         return jsonify({
             'error': f'Failed to generate question: {str(e)}',
@@ -164,6 +478,7 @@ def manage_topics():
         return render_template('manage_topics.html', topics=topics)
     except Exception as e:
         error_details = traceback.format_exc()
+        _log_error('manage_topics', error_details)
         # Error displaying manage_topics page
         return render_template('error.html', error=str(e)), 500
 
@@ -194,6 +509,7 @@ def add_topic():
         
     except Exception as e:
         error_details = traceback.format_exc()
+        _log_error('add_topic', error_details)
         return render_template('manage_topics.html', 
                             topics=FirebaseService.get_all_topics() if 'FirebaseService' in locals() else [], 
                             message=f"Error adding topic: {str(e)}", 
@@ -226,11 +542,32 @@ def remove_topic():
         
     except Exception as e:
         error_details = traceback.format_exc()
+        _log_error('remove_topic', error_details)
         return render_template('manage_topics.html', 
                             topics=FirebaseService.get_all_topics() if 'FirebaseService' in locals() else [], 
                             message=f"Error removing topic: {str(e)}", 
                             success=False)
 
+@app.route('/topics/<path:topic>/priority', methods=['PUT'])
+@require_admin
+def set_topic_priority(topic):
+    """Set a topic's sampling priority (default 1.0, 0 stops it being picked)."""
+    try:
+        priority = float((request.get_json(silent=True) or {}).get('priority'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'priority must be a number'}), 400
+    if priority < 0:
+        return jsonify({'error': 'priority must not be negative'}), 400
+    try:
+        from firebase_service import FirebaseService
+        if not FirebaseService.set_topic_priority(topic, priority):
+            return jsonify({'error': f"Topic '{topic}' not found"}), 404
+        return jsonify({'topic': topic, 'priority': priority})
+    except Exception as e:
+        error_details = traceback.format_exc()
+        _log_error('set_topic_priority', error_details)
+        return jsonify({'error': f'Error setting priority: {str(e)}'}), 500
+
 # Error handlers
 @app.errorhandler(404)
 def page_not_found(e):
@@ -242,16 +579,173 @@ def server_error(e):
     # 500 error
     return render_template('error.html', error="Internal server error"), 500
 
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.monotonic()
+    g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.http_requests_in_flight.inc(route=g.metrics_route)
+    if tracing.TRACING_ENABLED:
+        g.trace_root, g.trace_token = tracing.start_trace(
+            f'{request.method} {g.metrics_route}',
+            request_id=request.headers.get('X-Request-ID'),
+            traceparent=request.headers.get('traceparent'),
+            **{'http.method': request.method, 'http.route': g.metrics_route}
+        )
+
+@app.after_request
+def _record_request_metrics(response):
+    if 'request_start' in g:
+        metrics.http_request_duration.observe(
+            time.monotonic() - g.request_start,
+            route=g.metrics_route, method=request.method, status=response.status_code
+        )
+    if 'trace_root' in g:
+        g.trace_root.set_attribute('http.status_code', response.status_code)
+        response.headers['X-Request-ID'] = g.trace_root.trace.request_id
+        response.headers['traceparent'] = tracing.traceparent(g.trace_root)
+    return response
+
+@app.teardown_request
+def _finish_request(exc):
+    if 'metrics_route' in g:
+        metrics.http_requests_in_flight.dec(route=g.metrics_route)
+    if 'trace_root' in g:
+        if exc is not None:
+            g.trace_root.record_error(exc)
+        tracing.end_trace(g.trace_root, g.trace_token)
+
+# Retained slow and sampled traces
+@app.route('/debug/traces')
+@require_admin
+def debug_traces():
+    return jsonify([
+        {key: trace[key] for key in ('trace_id', 'request_id', 'name', 'duration_ms', 'slow')}
+        for trace in tracing.retained_traces()
+    ])
+
+@app.route('/debug/traces/<trace_id>')
+@require_admin
+def debug_trace(trace_id):
+    trace = tracing.get_retained_trace(trace_id)
+    if trace is None:
+        return jsonify({'error': f"Trace '{trace_id}' not found"}), 404
+    return jsonify(trace)
+
+# Sampling CPU profile, run in the background and fetched as collapsed stacks for flamegraph tools
+@app.route('/debug/profile', methods=['POST'])
+@require_admin
+def debug_profile():
+    try:
+        seconds = float(request.args.get('seconds', 10))
+    except ValueError:
+        return jsonify({'error': 'seconds must be a number'}), 400
+    try:
+        started = profiler.start_profile(seconds)
+    except profiler.ProfilerBusyError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify(dict(started, status='running', url=f"/debug/profile/{started['profile_id']}")), 202
+
+@app.route('/debug/profile/<profile_id>')
+@require_admin
+def debug_profile_result(profile_id):
+    profile = profiler.get_profile(profile_id)
+    if profile is None:
+        return jsonify({'error': f"Profile '{profile_id}' not found"}), 404
+    status, stacks = profile
+    if status == 'running':
+        return jsonify({'profile_id': profile_id, 'status': status}), 202
+    return Response(stacks, mimetype='text/plain')
+
+def _limit_arg():
+    """Read the non-negative integer 'limit' query argument (default 20)."""
+    limit = int(request.args.get('limit', 20))
+    if limit < 0:
+        raise ValueError
+    return limit
+
+@app.route('/debug/memory/snapshots', methods=['GET', 'POST'])
+@require_admin
+def debug_memory_snapshots():
+    if request.method == 'POST':
+        try:
+            limit = _limit_arg()
+        except ValueError:
+            return jsonify({'error': 'limit must be a non-negative integer'}), 400
+        return jsonify(profiler.take_snapshot(limit=limit)), 201
+    return jsonify({'pid': os.getpid(), 'memory': profiler.memory_usage(), 'snapshots': profiler.list_snapshots()})
+
+@app.route('/debug/memory/diff')
+@require_admin
+def debug_memory_diff():
+    from_id = request.args.get('from')
+    if not from_id:
+        return jsonify({'error': 'from snapshot id is required'}), 400
+    try:
+        limit = _limit_arg()
+    except ValueError:
+        return jsonify({'error': 'limit must be a non-negative integer'}), 400
+    to_id = request.args.get('to')
+    # Snapshots live in the worker that took them
+    for snapshot_id in (from_id, to_id):
+        owner = profiler.snapshot_pid(snapshot_id) if snapshot_id else None
+        if owner is not None and owner != os.getpid():
+            return jsonify({
+                'error': f"Snapshot '{snapshot_id}' was taken by worker {owner}, "
+                         f"but this request reached worker {os.getpid()}",
+                'pid': os.getpid()
+            }), 409
+    diff = profiler.diff_snapshots(from_id, to_id, limit=limit)
+    if diff is None:
+        return jsonify({'error': 'Snapshot not found'}), 404
+    return jsonify(diff)
+
+@app.route('/debug/memory/stop', methods=['POST'])
+@require_admin
+def debug_memory_stop():
+    profiler.stop_tracing()
+    return jsonify({'status': 'stopped'})
+
+# Prometheus metrics endpoint
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # Health check endpoint
 @app.route('/health')
 def health_check():
-    return jsonify({'status': 'healthy'}), 200
+    breakers = circuit_breaker.snapshot()
+    degraded = any(b['state'] != circuit_breaker.CLOSED for b in breakers.values())
+    return jsonify({
+        'status': 'degraded' if degraded else 'healthy',
+        'breakers': breakers
+    }), 200
 
 # Root path handler
 @app.route('/')
 def index():
     return render_template('index.html')
 
+# Run slots, tenants holding them and queued runs
+@app.route('/debug/runs')
+@require_admin
+def debug_runs():
+    return jsonify(run_scheduler.snapshot())
+
+# Boot timing and warm-up progress
+@app.route('/debug/startup')
+@require_admin
+def debug_startup():
+    return jsonify(warmup.report())
+
+# Current topic sampling weights
+@app.route('/debug/topics')
+@require_admin
+def debug_topics():
+    return jsonify(topic_sampler.snapshot())
+
+warmup.record_stage('import.app', time.perf_counter() - BOOT_STARTED)
+warmup.start()
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8001))  # Default to 8001 for local dev
     app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List
+
+import question_store
+from circuit_breaker import CircuitOpenError
+from submitCode import submit_code
+
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', '8'))
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '500'))
+
+# Shared by every batch request in this process so concurrent batches
+# can't multiply the number of in-flight evaluations
+_global_slots = threading.BoundedSemaphore(BATCH_MAX_CONCURRENCY)
+
+
+def _digest(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def _grade(item: dict) -> dict:
+    actualSolution, referenceLanguage = item.get('actualSolution'), None
+    if item.get('question_id'):
+        reference = question_store.get_reference_solution(item['question_id'], item['language'])
+        if reference:
+            actualSolution, referenceLanguage = reference
+        elif not actualSolution:
+            return {'result': 'Failure',
+                    'message': f"Question '{item['question_id']}' is not stored. Send actualSolution with the item."}
+    with _global_slots:
+        # Errors are raised so an unreachable grader isn't reported as a failing grade
+        return submit_code(actualSolution, item['description'], item['typedSolution'], item['language'],
+                           referenceLanguage=referenceLanguage, raise_errors=True)
+
+
+def validate_item(item) -> str:
+    """Return an error message for a malformed batch item, or '' if it's valid."""
+    if not isinstance(item, dict):
+        return 'Each item must be a JSON object.'
+    if not all([item.get('description'), item.get('typedSolution'), item.get('language')]):
+        return 'Missing required fields in submission.'
+    for field in ('description', 'typedSolution', 'language', 'actualSolution', 'question_id'):
+        if item.get(field) is not None and not isinstance(item[field], str):
+            return f'{field} must be a string.'
+    return ''
+
+
+def group_items(items: List[dict]) -> "OrderedDict[str, OrderedDict[str, List[int]]]":
+    """
+    Group valid items by problem, then by identical submission
+
+    Returns:
+        OrderedDict: problem key -> submission key -> indexes of matching items
+    """
+    groups = OrderedDict()
+    for index, item in enumerate(items):
+        if validate_item(item):
+            continue
+        problem_key = _digest(item['description'], item.get('question_id') or '', item.get('actualSolution') or '')
+        submission_key = _digest(item['language'], item['typedSolution'].strip())
+        groups.setdefault(problem_key, OrderedDict()).setdefault(submission_key, []).append(index)
+    return groups
+
+
+def grade_batch(items: List[dict]) -> Iterator[dict]:
+    """
+    Grade a batch of submissions concurrently, yielding results as they finish
+
+    Items are grouped by problem so each problem's submissions are scheduled
+    together, and identical submissions to the same problem are evaluated once
+    and fanned out to every matching item.
+
+    Args:
+        items (List[dict]): Items with description, typedSolution and language, and
+            optionally question_id or actualSolution for the reference solution
+
+    Yields:
+        dict: Per-item result with its index in the request
+    """
+    for index, item in enumerate(items):
+        error = validate_item(item)
+        if error:
+            yield {'index': index, 'id': item.get('id') if isinstance(item, dict) else None,
+                   'result': 'Failure', 'message': error}
+
+    groups = group_items(items)
+    unique = [indexes for submissions in groups.values() for indexes in submissions.values()]
+    if not unique:
+        return
+
+    pool = ThreadPoolExecutor(max_workers=min(BATCH_MAX_CONCURRENCY, len(unique)))
+    try:
+        futures = {}
+        for indexes in unique:
+            future = pool.submit(_grade, items[indexes[0]])
+            futures[future] = indexes
+
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except CircuitOpenError:
+                result = {'result': 'Failure', 'degraded': True,
+                          'message': 'The grader is temporarily unavailable. Please resubmit this item shortly.'}
+            except Exception as e:
+                result = {'result': 'Failure', 'message': f'Error while processing submission: {str(e)}'}
+            for index in futures[future]:
+                yield dict(result, index=index, id=items[index].get('id'))
+    finally:
+        # Stop queued evaluations if the client disconnects mid-stream
+        pool.shutdown(wait=False, cancel_futures=True)
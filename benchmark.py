@@ -0,0 +1,220 @@
+"""
+Offline benchmark for the API endpoints
+
+Boots the Flask app with the fake LLM backend and an in-memory Firestore
+stand-in, drives each endpoint at a fixed concurrency and reports
+throughput, latency percentiles and peak RSS as JSON.
+
+    python benchmark.py --concurrency 16 --requests 500 --latency 0.2 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SCENARIOS = ('compiler', 'submit', 'get_dsa_question', 'topics')
+
+
+class _Snapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class _Document:
+    def __init__(self, collection, doc_id):
+        self._collection = collection
+        self.id = doc_id
+
+    def get(self):
+        with self._collection.lock:
+            return _Snapshot(self.id, self._collection.docs.get(self.id))
+
+    def set(self, data):
+        with self._collection.lock:
+            self._collection.docs[self.id] = dict(data)
+
+    def update(self, data):
+        with self._collection.lock:
+            self._collection.docs[self.id].update(data)
+
+    def delete(self):
+        with self._collection.lock:
+            self._collection.docs.pop(self.id, None)
+
+
+class _Collection:
+    def __init__(self):
+        self.docs = {}
+        self.lock = threading.Lock()
+
+    def document(self, doc_id):
+        return _Document(self, doc_id)
+
+    def stream(self):
+        with self.lock:
+            items = list(self.docs.items())
+        return [_Snapshot(doc_id, data) for doc_id, data in items]
+
+
+class InMemoryFirestore:
+    """The subset of the Firestore client used by FirebaseService."""
+
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def collection(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = _Collection()
+            return self._collections[name]
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _request_for(scenario, i):
+    """Return (method, path, kwargs) for the i-th request of a scenario."""
+    if scenario == 'compiler':
+        return 'post', '/compiler', {'json': {'lang': 'python', 'code': f'print({i})'}}
+    if scenario == 'submit':
+        return 'post', '/submit', {'json': {
+            'description': f'Return the sum of two integers (variant {i % 20}).',
+            'typedSolution': f'def solve(a, b):\n    return a + b  # {i}',
+            'language': 'python'
+        }}
+    if scenario == 'get_dsa_question':
+        return 'get', '/get_dsa_question', {}
+    # Topic routes: mostly reads with some writes
+    if i % 4 == 1:
+        return 'post', '/add_topic', {'data': {'new_topic': f'Bench Topic {i}'}}
+    if i % 4 == 3:
+        return 'post', '/remove_topic', {'data': {'topic': f'Bench Topic {i - 2}'}}
+    return 'get', '/manage_topics', {}
+
+
+def run_scenario(app, scenario, concurrency, total):
+    """Send `total` requests for a scenario with `concurrency` client threads."""
+    local = threading.local()
+
+    def one(i):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        method, path, kwargs = _request_for(scenario, i)
+        start = time.perf_counter()
+        response = getattr(client, method)(path, **kwargs)
+        response.get_data()
+        return time.perf_counter() - start, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, status in results if status >= 400)
+    return {
+        'requests': total,
+        'errors': errors,
+        'duration_seconds': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'p50': round(_percentile(latencies, 0.50) * 1000, 3),
+            'p95': round(_percentile(latencies, 0.95) * 1000, 3),
+            'p99': round(_percentile(latencies, 0.99) * 1000, 3),
+            'max': round(latencies[-1] * 1000, 3),
+        },
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def boot_app(latency, topics):
+    """Import the app with the fake LLM backend and an in-memory Firestore."""
+    workdir = tempfile.mkdtemp(prefix='dsa-bench-')
+    os.environ['LLM_PROVIDER'] = 'fake'
+    os.environ['FAKE_LLM_LATENCY'] = str(latency)
+    os.environ['RATE_LIMIT_ENABLED'] = 'false'
+    os.environ['SUBMIT_MODE'] = 'sync'
+    os.environ['WARMUP_MODE'] = 'eager'
+    os.environ.setdefault('JOB_QUEUE_DB', os.path.join(workdir, 'jobs.db'))
+    os.environ.setdefault('RATE_LIMIT_DB', os.path.join(workdir, 'ratelimit.db'))
+    os.environ.setdefault('QUESTION_STORE_DB', os.path.join(workdir, 'questions.db'))
+    os.environ.setdefault('METRICS_DB', os.path.join(workdir, 'metrics.db'))
+    os.environ.setdefault('REPORT_STORE_DIR', os.path.join(workdir, 'reports'))
+    os.environ.setdefault('TRACE_FILE', os.path.join(workdir, 'traces.jsonl'))
+
+    from firebase_service import FirebaseService
+    FirebaseService._instance = object()
+    FirebaseService.db = InMemoryFirestore()
+    for i in range(topics):
+        FirebaseService.get_topics_collection().document(f'Topic {i}').set({'created_at': 0})
+
+    from app import app
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--latency', type=float, default=0.05, help='fake LLM latency in seconds')
+    parser.add_argument('--topics', type=int, default=50, help='topics seeded into Firestore')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    app = boot_app(args.latency, args.topics)
+    import profiler
+    import warmup
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'config': {
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'llm_latency': args.latency,
+            'topics': args.topics,
+        },
+        'startup': warmup.report()['stages'],
+        'scenarios': {},
+    }
+    for scenario in args.scenarios.split(','):
+        if scenario not in SCENARIOS:
+            parser.error(f'unknown scenario {scenario!r}')
+        report['scenarios'][scenario] = run_scenario(app, scenario, args.concurrency, args.requests)
+    report['peak_rss_bytes'] = profiler.memory_usage().get('peak_rss_bytes')
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from collections import deque
+
+from config import LLM_ROUTES
+from llm_provider import get_route
+
+# Breaker configuration, shared by every call site
+BREAKER_WINDOW = int(os.getenv('BREAKER_WINDOW', '20'))
+BREAKER_MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', '10'))
+BREAKER_FAILURE_RATIO = float(os.getenv('BREAKER_FAILURE_RATIO', '0.5'))
+BREAKER_SLOW_RATIO = float(os.getenv('BREAKER_SLOW_RATIO', '0.5'))
+# Calls slower than this fraction of the call site's deadline count as slow
+BREAKER_SLOW_FRACTION = float(os.getenv('BREAKER_SLOW_FRACTION', '0.8'))
+BREAKER_OPEN_SECONDS = float(os.getenv('BREAKER_OPEN_SECONDS', '30'))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because its breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Error-rate and latency circuit breaker over a sliding window of calls
+
+    The breaker opens when either the failure ratio or the slow call ratio
+    of the last BREAKER_WINDOW calls reaches its threshold. After
+    BREAKER_OPEN_SECONDS a single probe call is let through; its outcome
+    closes the breaker or opens it again.
+    """
+
+    def __init__(self, name: str, slow_call_seconds: float):
+        self.name = name
+        self.slow_call_seconds = slow_call_seconds
+        self._calls = deque(maxlen=BREAKER_WINDOW)  # (failed, slow) pairs
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= BREAKER_OPEN_SECONDS:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected, without claiming a probe slot."""
+        with self._lock:
+            state = self._current_state()
+            return state == OPEN or (state == HALF_OPEN and self._probe_in_flight)
+
+    def before_call(self):
+        """Reserve a call slot or raise CircuitOpenError."""
+        with self._lock:
+            state = self._current_state()
+            if state == OPEN:
+                raise CircuitOpenError(f"Circuit '{self.name}' is open")
+            if state == HALF_OPEN:
+                if self._probe_in_flight:
+                    raise CircuitOpenError(f"Circuit '{self.name}' is half-open")
+                self._probe_in_flight = True
+
+    def record(self, failed: bool, seconds: float):
+        """Record the outcome of a call admitted by before_call."""
+        slow = seconds >= self.slow_call_seconds
+        with self._lock:
+            if self._current_state() == HALF_OPEN:
+                if failed or slow:
+                    self._trip()
+                else:
+                    self._state = CLOSED
+                    self._calls.clear()
+                self._probe_in_flight = False
+                return
+
+            self._calls.append((failed, slow))
+            if len(self._calls) < BREAKER_MIN_CALLS:
+                return
+            failures = sum(1 for f, _ in self._calls if f)
+            slow_calls = sum(1 for _, s in self._calls if s)
+            if (failures / len(self._calls) >= BREAKER_FAILURE_RATIO
+                    or slow_calls / len(self._calls) >= BREAKER_SLOW_RATIO):
+                self._trip()
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            state = self._current_state()
+            calls = list(self._calls)
+        return {
+            'state': state,
+            'calls': len(calls),
+            'failures': sum(1 for f, _ in calls if f),
+            'slow_calls': sum(1 for _, s in calls if s),
+        }
+
+
+_breakers = {}
+_lock = threading.Lock()
+
+
+def get_breaker(call_site: str) -> CircuitBreaker:
+    """Get the breaker guarding an LLM call site."""
+    with _lock:
+        if call_site not in _breakers:
+            timeout = get_route(call_site)['timeout']
+            _breakers[call_site] = CircuitBreaker(call_site, timeout * BREAKER_SLOW_FRACTION)
+        return _breakers[call_site]
+
+
+def snapshot() -> dict:
+    """State of every breaker, keyed by call site."""
+    return {call_site: get_breaker(call_site).snapshot() for call_site in LLM_ROUTES}
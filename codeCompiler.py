@@ -1,5 +1,8 @@
 
-from config import llm  # Assumes llm is a LangChain LLM instance like ChatOpenAI or Gemini
+import llm_client
+import prevalidate
+import prompt_builder
+import tracing
 import re
 
 LANGUAGE_PROMPTS = {
@@ -8,6 +11,30 @@ LANGUAGE_PROMPTS = {
     "java": "You are a Java compiler that accurately simulates the behavior of javac."
 }
 
+def check_code_locally(code: str, lang: str) -> dict:
+    """Degraded compile used while the model is unavailable: a local syntax check only."""
+    outcome, diagnostics = prevalidate.check_syntax(code, lang)
+    if outcome == prevalidate.FAILED:
+        return {
+            'result': 'SyntaxError' if lang == "python" else 'Failure',
+            'message': diagnostics,
+            'corrected_code': None,
+            'degraded': True
+        }
+    if outcome == prevalidate.PASSED:
+        return {
+            'result': 'Success',
+            'message': 'Syntax check passed. Program output is unavailable while the compiler service is degraded.',
+            'corrected_code': None,
+            'degraded': True
+        }
+    return {
+        'result': 'Unavailable',
+        'message': f'The compiler service is temporarily degraded and cannot run {lang} code. Please try again shortly.',
+        'corrected_code': None,
+        'degraded': True
+    }
+
 def compile_code(code: str, lang: str) -> dict:
     # Handle empty code input
     if not code or code.isspace():
@@ -17,6 +44,14 @@ def compile_code(code: str, lang: str) -> dict:
             'corrected_code': None
         }
 
+    # Code that fails to compile locally never needs the model
+    failure = prevalidate.compile_failure(code, lang)
+    if failure:
+        return failure
+
+    # Strip comments and whitespace, keeping line numbers, within the token budget
+    code = prompt_builder.build_compile_input(code, lang)
+
     language_prompt = LANGUAGE_PROMPTS.get(lang, "You are an accurate code compiler/interpreter.")
     
     # Create language-specific prompts
@@ -114,8 +149,13 @@ Respond in this exact format:
 [CorrectedCode]: N/A
 """
 
-    response = llm.invoke(prompt).content
+    response = llm_client.invoke('compile', prompt).content
+
+    with tracing.span('compile.parse'):
+        return parse_compiler_response(response, lang)
 
+def parse_compiler_response(response: str, lang: str) -> dict:
+    """Extract the result, message and corrected code from the model's response."""
     # Extract result
     result_match = re.search(r'\[Result\]:\s*(.*)', response)
     result = result_match.group(1).strip() if result_match else "Unknown"
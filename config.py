@@ -1,8 +1,47 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-
-# Configure Gemini Flash model
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash",
-    temperature=0.7,
-    convert_system_message_to_human=True
-)
\ No newline at end of file
+import os
+
+# Backend used when a call site doesn't override it: 'gemini' or 'fake'
+LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'gemini')
+
+# Simulated response time of the fake backend, in seconds
+FAKE_LLM_LATENCY = float(os.getenv('FAKE_LLM_LATENCY', '0'))
+
+# Retries across all call sites may add at most this fraction of extra calls
+LLM_RETRY_BUDGET_RATIO = float(os.getenv('LLM_RETRY_BUDGET_RATIO', '0.2'))
+# Retries always allowed before the ratio kicks in (also the budget's cap)
+LLM_RETRY_BUDGET_RESERVE = float(os.getenv('LLM_RETRY_BUDGET_RESERVE', '10'))
+# Jittered exponential backoff between attempts, in seconds
+LLM_RETRY_BACKOFF_BASE = float(os.getenv('LLM_RETRY_BACKOFF_BASE', '0.5'))
+LLM_RETRY_BACKOFF_CAP = float(os.getenv('LLM_RETRY_BACKOFF_CAP', '8'))
+
+
+def _route(name: str, model: str, temperature: float, max_tokens: int,
+           timeout: float, max_retries: int, hedge: bool) -> dict:
+    """Build a call site's model settings, overridable with LLM_<NAME>_* variables."""
+    prefix = f'LLM_{name.upper()}_'
+    return {
+        'provider': os.getenv(prefix + 'PROVIDER', LLM_PROVIDER),
+        'model': os.getenv(prefix + 'MODEL', model),
+        'temperature': float(os.getenv(prefix + 'TEMPERATURE', temperature)),
+        'max_tokens': int(os.getenv(prefix + 'MAX_TOKENS', max_tokens)),
+        # Deadline for the whole call, including retries and hedges
+        'timeout': float(os.getenv(prefix + 'TIMEOUT', timeout)),
+        'max_retries': int(os.getenv(prefix + 'MAX_RETRIES', max_retries)),
+        # Send a duplicate request once the call outlives the p95 latency
+        'hedge': os.getenv(prefix + 'HEDGE', str(hedge)).lower() in ('1', 'true', 'yes'),
+    }
+
+
+# Model settings per call site
+LLM_ROUTES = {
+    # Compile simulation should be deterministic and cheap
+    'compile': _route('compile', 'gemini-2.0-flash-lite', 0.0, 2048,
+                      timeout=20, max_retries=2, hedge=True),
+    'submit': _route('submit', 'gemini-2.0-flash', 0.7, 8192,
+                     timeout=90, max_retries=1, hedge=False),
+    'generate': _route('generate', 'gemini-2.0-flash', 0.7, 8192,
+                       timeout=60, max_retries=2, hedge=True),
+    # Ports the generated C++ solution to the other languages
+    'translate': _route('translate', 'gemini-2.0-flash', 0.2, 4096,
+                        timeout=45, max_retries=2, hedge=True),
+}
@@ -1,18 +1,25 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
 import os
+import threading
+import topic_sampler
+import tracing
 
 class FirebaseService:
     _instance = None
+    _lock = threading.Lock()
     
     @classmethod
     def initialize(cls):
-        if not cls._instance:
-            # Initialize Firebase Admin SDK
-            cred = credentials.Certificate('serviceAccountKey.json')
-            firebase_admin.initialize_app(cred)
-            cls._instance = firebase_admin.get_app()
-            cls.db = firestore.client()
+        with cls._lock:
+            if not cls._instance:
+                # The SDK is imported here so app startup doesn't pay for it
+                import firebase_admin
+                from firebase_admin import credentials, firestore
+
+                # Initialize Firebase Admin SDK
+                cred = credentials.Certificate('serviceAccountKey.json')
+                firebase_admin.initialize_app(cred)
+                cls.db = firestore.client()
+                cls._instance = firebase_admin.get_app()
     
     @classmethod
     def get_db(cls):
@@ -27,10 +34,36 @@ class FirebaseService:
     @classmethod
     def get_all_topics(cls):
         """Get all topics from Firestore"""
-        topics_ref = cls.get_topics_collection()
-        docs = topics_ref.stream()
-        return [doc.id for doc in docs]
+        with tracing.span('firestore.get_all_topics') as span:
+            topics_ref = cls.get_topics_collection()
+            docs = topics_ref.stream()
+            topics = [doc.id for doc in docs]
+            span.set_attribute('topic_count', len(topics))
+            return topics
     
+    @classmethod
+    def get_topic_priorities(cls):
+        """Get every topic with its sampling priority (1.0 unless set)"""
+        with tracing.span('firestore.get_topic_priorities') as span:
+            priorities = {}
+            for doc in cls.get_topics_collection().stream():
+                data = doc.to_dict() or {}
+                priorities[doc.id] = float(data.get('priority', 1.0))
+            span.set_attribute('topic_count', len(priorities))
+            return priorities
+
+    @classmethod
+    def set_topic_priority(cls, topic_name, priority):
+        """Set how often a topic is picked relative to the others"""
+        topic_doc = cls.get_topics_collection().document(topic_name)
+
+        if not topic_doc.get().exists:
+            return False  # Topic doesn't exist
+
+        topic_doc.update({'priority': priority})
+        topic_sampler.invalidate()
+        return True
+
     @classmethod
     def add_topic(cls, topic_name):
         """Add a new topic to Firestore"""
@@ -40,7 +73,9 @@ class FirebaseService:
         if topic_doc.get().exists:
             return False  # Topic already exists
         
+        from firebase_admin import firestore
         topic_doc.set({'created_at': firestore.SERVER_TIMESTAMP})
+        topic_sampler.invalidate()
         return True
     
     @classmethod
@@ -53,13 +88,10 @@ class FirebaseService:
             return False  # Topic doesn't exist
         
         topic_doc.delete()
+        topic_sampler.invalidate()
         return True
     
     @classmethod
     def get_random_topic(cls):
-        """Get a random topic from Firestore"""
-        import random
-        topics = cls.get_all_topics()
-        if not topics:
-            return None
-        return random.choice(topics)
+        """Get a topic weighted by priority, recent serves and question pool coverage"""
+        return topic_sampler.draw()
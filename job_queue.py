@@ -0,0 +1,393 @@
+import ipaddress
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from circuit_breaker import BREAKER_OPEN_SECONDS, CircuitOpenError, get_breaker
+
+# Queue configuration
+JOB_QUEUE_DB = os.getenv('JOB_QUEUE_DB', 'jobs.db')
+JOB_MAX_CONCURRENCY = int(os.getenv('JOB_MAX_CONCURRENCY', '2'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_RETRY_BACKOFF = float(os.getenv('JOB_RETRY_BACKOFF', '5'))
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '300'))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+# How long after it was queued a job keeps waiting out a grader outage before it fails
+JOB_OUTAGE_MAX_WAIT = float(os.getenv('JOB_OUTAGE_MAX_WAIT', '3600'))
+WEBHOOK_TIMEOUT = float(os.getenv('JOB_WEBHOOK_TIMEOUT', '10'))
+# Comma-separated hosts webhooks may be sent to; when empty, any host that
+# resolves only to public addresses is allowed
+WEBHOOK_ALLOWED_HOSTS = {
+    host.strip().lower() for host in os.getenv('JOB_WEBHOOK_ALLOWED_HOSTS', '').split(',') if host.strip()
+}
+# Accepted range for a job's priority
+MIN_PRIORITY = -1000
+MAX_PRIORITY = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    webhook_url TEXT,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, priority DESC, available_at);
+"""
+
+# HTTP statuses of provider errors that mean the model is unavailable, not that the job is bad
+_OUTAGE_STATUSES = {429, 500, 502, 503, 504}
+
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_dispatcher = None
+_executor = None
+_local_slots = threading.BoundedSemaphore(JOB_MAX_CONCURRENCY)
+
+
+class GraderUnavailableError(Exception):
+    """The grading model was unreachable; the job waits for it without using up an attempt."""
+    outage = True
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(JOB_QUEUE_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    return conn
+
+
+def init_db():
+    """Create the jobs table if it doesn't exist yet."""
+    conn = _connect()
+    try:
+        conn.executescript(_SCHEMA)
+    finally:
+        conn.close()
+
+
+def _row_to_job(row) -> dict:
+    return {
+        'job_id': row['id'],
+        'status': row['status'],
+        'priority': row['priority'],
+        'attempts': row['attempts'],
+        'max_attempts': row['max_attempts'],
+        'result': json.loads(row['result']) if row['result'] else None,
+        'error': row['error'],
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at'],
+    }
+
+
+def validate_webhook_url(url: str) -> List[str]:
+    """
+    Check a webhook URL is safe to POST to from this server
+
+    Returns:
+        List[str]: The public addresses the host resolved to, or [] for a host
+        in WEBHOOK_ALLOWED_HOSTS
+
+    Raises:
+        ValueError: If it isn't http(s), or its host isn't allowed or resolves
+            to a private, loopback, link-local or otherwise non-public address
+    """
+    try:
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+    except ValueError:
+        raise ValueError('webhook_url is not a valid URL.')
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError('webhook_url must be an http or https URL.')
+    host = parts.hostname.lower()
+    if WEBHOOK_ALLOWED_HOSTS:
+        if host not in WEBHOOK_ALLOWED_HOSTS:
+            raise ValueError(f"webhook_url host '{host}' is not allowed.")
+        return []
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError):
+        raise ValueError(f"webhook_url host '{host}' could not be resolved.")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"webhook_url host '{host}' does not resolve to a public address.")
+    return sorted(addresses)
+
+
+def enqueue(payload: dict, priority: int = 0, webhook_url: Optional[str] = None,
+            max_attempts: Optional[int] = None, delay: float = 0) -> str:
+    """
+    Persist a submission job and wake the dispatcher
+
+    Args:
+        payload (dict): Keyword arguments for submit_code
+        priority (int): Higher priorities are claimed first
+        webhook_url (Optional[str]): URL notified with the final job state
+        max_attempts (Optional[int]): Overrides JOB_MAX_ATTEMPTS for this job
+        delay (float): Seconds before the job may be claimed
+
+    Returns:
+        str: The new job id
+    """
+    ensure_started()
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute(
+            'INSERT INTO jobs (id, status, priority, payload, attempts, max_attempts, '
+            'webhook_url, available_at, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?, ?)',
+            (job_id, 'queued', priority, json.dumps(payload),
+             max_attempts or JOB_MAX_ATTEMPTS, webhook_url, now + delay, now, now)
+        )
+    finally:
+        conn.close()
+    _wakeup.set()
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """Return the current state of a job, or None if it doesn't exist."""
+    ensure_started()
+    conn = _connect()
+    try:
+        row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return _row_to_job(row) if row else None
+
+
+def _claim_next() -> Optional[sqlite3.Row]:
+    """
+    Atomically claim the highest priority ready job.
+
+    Running jobs are counted across every process sharing the database, so
+    JOB_MAX_CONCURRENCY is a global cap. Jobs whose lease expired (their
+    worker died) are reclaimed.
+    """
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        running = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'running' AND lease_until > ?", (now,)
+        ).fetchone()[0]
+        if running >= JOB_MAX_CONCURRENCY:
+            conn.execute('COMMIT')
+            return None
+
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE (status = 'queued' AND available_at <= ?) "
+            "OR (status = 'running' AND lease_until <= ?) "
+            "ORDER BY priority DESC, available_at ASC LIMIT 1",
+            (now, now)
+        ).fetchone()
+        if row is None:
+            conn.execute('COMMIT')
+            return None
+
+        conn.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+            "lease_until = ?, updated_at = ? WHERE id = ?",
+            (now + JOB_LEASE_SECONDS, now, row['id'])
+        )
+        conn.execute('COMMIT')
+        return conn.execute('SELECT * FROM jobs WHERE id = ?', (row['id'],)).fetchone()
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+
+def is_outage_error(error: Exception) -> bool:
+    """Whether an error means the grader is unavailable rather than that the submission is bad."""
+    # Breaker rejections, timeouts and network errors, or a provider error status
+    return (isinstance(error, (CircuitOpenError, OSError))
+            or getattr(error, 'code', None) in _OUTAGE_STATUSES)
+
+
+def _execute_job(payload: dict) -> dict:
+    """Run a submission inside a worker process."""
+    from submitCode import submit_code
+    try:
+        return submit_code(raise_errors=True, **payload)
+    except Exception as e:
+        if is_outage_error(e):
+            # A plain exception type also pickles back to the dispatcher reliably
+            raise GraderUnavailableError(str(e)) from None
+        raise
+
+
+def _finish(job: sqlite3.Row, result: Optional[dict], error: Optional[str], retryable: bool = True,
+            outage: bool = False):
+    now = time.time()
+    conn = _connect()
+    try:
+        if error is None:
+            conn.execute(
+                "UPDATE jobs SET status = 'succeeded', result = ?, error = NULL, "
+                "lease_until = NULL, updated_at = ? WHERE id = ?",
+                (json.dumps(result), now, job['id'])
+            )
+        elif outage and now - job['created_at'] < JOB_OUTAGE_MAX_WAIT:
+            # Waiting out an outage doesn't use up one of the job's attempts
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', error = ?, attempts = attempts - 1, available_at = ?, "
+                "lease_until = NULL, updated_at = ? WHERE id = ?",
+                (error, now + BREAKER_OPEN_SECONDS, now, job['id'])
+            )
+        elif retryable and job['attempts'] < job['max_attempts']:
+            # Exponential backoff before the job becomes claimable again
+            delay = JOB_RETRY_BACKOFF * (2 ** (job['attempts'] - 1))
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', error = ?, available_at = ?, "
+                "lease_until = NULL, updated_at = ? WHERE id = ?",
+                (error, now + delay, now, job['id'])
+            )
+        else:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, lease_until = NULL, "
+                "updated_at = ? WHERE id = ?",
+                (error, now, job['id'])
+            )
+        row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job['id'],)).fetchone()
+    finally:
+        conn.close()
+
+    if row['status'] in ('succeeded', 'failed') and row['webhook_url']:
+        threading.Thread(target=_notify_webhook, args=(row['webhook_url'], _row_to_job(row)),
+                         daemon=True).start()
+
+
+def _pinned_request(url: str, address: str):
+    """
+    A session, URL and headers that send a request for `url` to `address`
+
+    The host is still sent as the Host header and, over https, used for SNI and
+    certificate checks, but it isn't resolved a second time.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    parts = urlsplit(url)
+    userinfo = parts.netloc.rpartition('@')[0]
+    netloc = f'[{address}]' if ':' in address else address
+    if parts.port:
+        netloc += f':{parts.port}'
+    if userinfo:
+        netloc = f'{userinfo}@{netloc}'
+
+    session = requests.Session()
+    if parts.scheme == 'https':
+        hostname = parts.hostname
+
+        class _PinnedAdapter(HTTPAdapter):
+            def init_poolmanager(self, *args, **kwargs):
+                kwargs['server_hostname'] = hostname
+                kwargs['assert_hostname'] = hostname
+                super().init_poolmanager(*args, **kwargs)
+
+        session.mount('https://', _PinnedAdapter())
+    return session, urlunsplit(parts._replace(netloc=netloc)), {'Host': parts.netloc.rpartition('@')[2]}
+
+
+def _notify_webhook(url: str, job: dict):
+    try:
+        # Checked again in case the host's DNS changed since the job was queued, and the
+        # checked address is the one connected to, so a second lookup can't swap it
+        addresses = validate_webhook_url(url)
+        import requests
+        session, target, headers = (_pinned_request(url, addresses[0]) if addresses
+                                    else (requests.Session(), url, {}))
+        with session:
+            # Redirects could point anywhere, including internal addresses
+            session.post(target, json=job, headers=headers, timeout=WEBHOOK_TIMEOUT, allow_redirects=False)
+    except Exception as e:
+        print(f"Error delivering webhook for job {job['job_id']}: {str(e)}")
+
+
+def _new_executor() -> ProcessPoolExecutor:
+    # Spawned workers avoid inheriting gRPC/HTTP client state from the parent
+    return ProcessPoolExecutor(
+        max_workers=JOB_MAX_CONCURRENCY,
+        mp_context=multiprocessing.get_context('spawn')
+    )
+
+
+def _on_done(job: sqlite3.Row, future):
+    global _executor
+    _local_slots.release()
+    try:
+        _finish(job, future.result(), None)
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            # A worker died; replace the pool so later jobs can still run
+            with _lock:
+                _executor = _new_executor()
+        try:
+            # Errors marked retryable = False (e.g. oversized input) fail immediately, and
+            # jobs hit by a grader outage wait for it to pass
+            _finish(job, None, str(e), retryable=getattr(e, 'retryable', True),
+                    outage=getattr(e, 'outage', False) or get_breaker('submit').is_open())
+        except Exception as db_error:
+            print(f"Error recording job {job['id']}: {str(db_error)}")
+    _wakeup.set()
+
+
+def _dispatch_loop():
+    while True:
+        if not _local_slots.acquire(timeout=JOB_POLL_INTERVAL):
+            continue
+        try:
+            job = _claim_next()
+        except Exception as e:
+            print(f"Error claiming job: {str(e)}")
+            job = None
+        if job is None:
+            _local_slots.release()
+            _wakeup.wait(JOB_POLL_INTERVAL)
+            _wakeup.clear()
+            continue
+        try:
+            future = _executor.submit(_execute_job, json.loads(job['payload']))
+        except RuntimeError:
+            # Interpreter is shutting down; the job's lease will expire and be reclaimed
+            _local_slots.release()
+            return
+        future.add_done_callback(lambda f, job=job: _on_done(job, f))
+
+
+def ensure_started():
+    """Create the schema and start the dispatcher thread once per process."""
+    global _dispatcher, _executor
+    if _dispatcher is not None:
+        return
+    with _lock:
+        if _dispatcher is not None:
+            return
+        init_db()
+        _executor = _new_executor()
+        _dispatcher = threading.Thread(target=_dispatch_loop, name='job-dispatcher', daemon=True)
+        _dispatcher.start()
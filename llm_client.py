@@ -0,0 +1,200 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional
+
+from config import (
+    LLM_RETRY_BUDGET_RATIO,
+    LLM_RETRY_BUDGET_RESERVE,
+    LLM_RETRY_BACKOFF_BASE,
+    LLM_RETRY_BACKOFF_CAP,
+)
+from llm_provider import get_llm, get_route
+from circuit_breaker import get_breaker, CircuitOpenError
+import metrics
+import tracing
+
+# Threads running model calls; abandoned attempts finish in the background
+_pool = ThreadPoolExecutor(max_workers=int(os.getenv('LLM_MAX_WORKERS', '32')),
+                           thread_name_prefix='llm')
+
+# Latency samples needed before hedging kicks in
+HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '20'))
+
+
+class LLMTimeoutError(TimeoutError):
+    """Raised when a model call misses its call site's deadline."""
+
+
+class RetryBudget:
+    """
+    Token bucket limiting retries and hedges to a fraction of all calls
+
+    Every call deposits `ratio` tokens and every retry or hedge withdraws one,
+    so a failing backend can't be hit with more than (1 + ratio) times the
+    normal load. The bucket starts full at `reserve` tokens.
+    """
+
+    def __init__(self, ratio: float, reserve: float):
+        self.ratio = ratio
+        self.reserve = reserve
+        self._tokens = reserve
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.reserve, self._tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+retry_budget = RetryBudget(LLM_RETRY_BUDGET_RATIO, LLM_RETRY_BUDGET_RESERVE)
+_latencies = {}
+_latencies_lock = threading.Lock()
+
+
+def _tracker(call_site: str) -> LatencyTracker:
+    with _latencies_lock:
+        if call_site not in _latencies:
+            _latencies[call_site] = LatencyTracker()
+        return _latencies[call_site]
+
+
+def _attempt(call_site: str, prompt: str, timeout: float, hedge: bool):
+    """Run one attempt, optionally hedged, and return the first successful message."""
+    model = get_llm(call_site)
+    tracker = _tracker(call_site)
+    start = time.monotonic()
+    pending = {_pool.submit(model.invoke, prompt)}
+
+    hedge_after = tracker.percentile(0.95) if hedge else None
+    if hedge_after is not None and hedge_after < timeout:
+        done, _ = wait(pending, timeout=hedge_after)
+        if not done and retry_budget.try_withdraw():
+            metrics.llm_hedges.inc(call_site=call_site)
+            pending.add(_pool.submit(model.invoke, prompt))
+
+    error = None
+    while pending:
+        remaining = timeout - (time.monotonic() - start)
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                tracker.record(time.monotonic() - start)
+                return future.result()
+            error = future.exception()
+        if not done:
+            break
+
+    if error is not None and not pending:
+        raise error
+    raise LLMTimeoutError(f"LLM call '{call_site}' timed out after {timeout:.1f}s")
+
+
+def invoke(call_site: str, prompt: str):
+    """
+    Call the model for a call site under its deadline and retry policy
+
+    Failed attempts are retried with full-jitter exponential backoff while the
+    deadline and the shared retry budget allow. Call sites with hedging enabled
+    send a duplicate request once an attempt outlives their p95 latency.
+    Calls are rejected with CircuitOpenError while the call site's breaker is open.
+
+    Args:
+        call_site (str): One of the keys of config.LLM_ROUTES
+        prompt (str): Prompt to send
+
+    Returns:
+        The model's response message
+    """
+    route = get_route(call_site)
+    breaker = get_breaker(call_site)
+    try:
+        breaker.before_call()
+    except CircuitOpenError:
+        metrics.llm_calls.inc(call_site=call_site, outcome='rejected')
+        raise
+
+    metrics.llm_calls_in_flight.inc(call_site=call_site)
+    start = time.monotonic()
+    try:
+        with tracing.span('llm.invoke', call_site=call_site, model=route['model']):
+            message = _invoke_with_retries(call_site, prompt, route)
+    except Exception as e:
+        elapsed = time.monotonic() - start
+        breaker.record(True, elapsed)
+        metrics.llm_call_duration.observe(elapsed, call_site=call_site)
+        metrics.llm_calls.inc(call_site=call_site,
+                              outcome='timeout' if isinstance(e, LLMTimeoutError) else 'error')
+        raise
+    finally:
+        metrics.llm_calls_in_flight.dec(call_site=call_site)
+
+    elapsed = time.monotonic() - start
+    breaker.record(False, elapsed)
+    metrics.llm_call_duration.observe(elapsed, call_site=call_site)
+    metrics.llm_calls.inc(call_site=call_site, outcome='success')
+    _record_tokens(call_site, prompt, message)
+    return message
+
+
+def _record_tokens(call_site: str, prompt: str, message):
+    # Prefer the provider's usage report; estimate at ~4 characters per token otherwise
+    usage = getattr(message, 'usage_metadata', None) or {}
+    prompt_tokens = usage.get('input_tokens', len(prompt) // 4)
+    completion_tokens = usage.get('output_tokens', len(getattr(message, 'content', '') or '') // 4)
+    metrics.llm_tokens.inc(prompt_tokens, call_site=call_site, kind='prompt')
+    metrics.llm_tokens.inc(completion_tokens, call_site=call_site, kind='completion')
+
+
+def _invoke_with_retries(call_site: str, prompt: str, route: dict):
+    deadline = time.monotonic() + route['timeout']
+    retry_budget.deposit()
+
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMTimeoutError(f"LLM call '{call_site}' timed out after {route['timeout']:.1f}s")
+        try:
+            return _attempt(call_site, prompt, remaining, route['hedge'])
+        except LLMTimeoutError:
+            raise
+        except Exception:
+            attempt += 1
+            if attempt > route['max_retries'] or not retry_budget.try_withdraw():
+                raise
+            delay = random.uniform(0, min(LLM_RETRY_BACKOFF_CAP, LLM_RETRY_BACKOFF_BASE * 2 ** (attempt - 1)))
+            if time.monotonic() + delay >= deadline:
+                raise
+            metrics.llm_retries.inc(call_site=call_site)
+            time.sleep(delay)
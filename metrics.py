@@ -0,0 +1,418 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# Each worker writes its metrics to a SQLite file shared by every process on
+# the host, and /metrics reports their combined values
+METRICS_MULTIPROCESS = os.getenv('METRICS_MULTIPROCESS', 'true').lower() in ('1', 'true', 'yes')
+METRICS_DB = os.getenv('METRICS_DB', 'metrics.db')
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', '5'))
+
+# Latency buckets in seconds; LLM calls can take minutes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ''
+    # Whether values of exited processes still count, as they do for counters
+    persistent = True
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+
+    def render(self, values: dict):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.kind}'
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        _ensure_flusher()
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def combine(self, a: float, b: float) -> float:
+        return a + b
+
+    def _reset(self):
+        super()._reset()
+        self._values = {}
+
+    def render(self, values: dict):
+        yield from super().render(values)
+        for key, value in values.items():
+            yield f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}'
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+    persistent = False
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 multiprocess_mode: str = 'sum'):
+        super().__init__(name, documentation, labels)
+        # 'sum' for per-process quantities, 'max' for values every process reports alike
+        self.multiprocess_mode = multiprocess_mode
+
+    def combine(self, a: float, b: float) -> float:
+        return max(a, b) if self.multiprocess_mode == 'max' else a + b
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        _ensure_flusher()
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}  # label values -> [bucket counts, sum, count]
+
+    def observe(self, value: float, **labels):
+        _ensure_flusher()
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {key: [list(s[0]), s[1], s[2]] for key, s in self._series.items()}
+
+    def combine(self, a: list, b: list) -> list:
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1], a[2] + b[2]]
+
+    def _reset(self):
+        super()._reset()
+        self._series = {}
+
+    def render(self, values: dict):
+        yield from super().render(values)
+        for key, (counts, total, count) in values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels + ('le',), key + (_format_value(bound),))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labels, key)
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+            yield f'{self.name}_count{labels} {count}'
+
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+
+def counter(name: str, documentation: str, labels: Tuple[str, ...] = ()) -> Counter:
+    return _register(Counter(name, documentation, labels))
+
+
+def gauge(name: str, documentation: str, labels: Tuple[str, ...] = (), multiprocess_mode: str = 'sum') -> Gauge:
+    return _register(Gauge(name, documentation, labels, multiprocess_mode))
+
+
+def histogram(name: str, documentation: str, labels: Tuple[str, ...] = (),
+              buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram(name, documentation, labels, buckets))
+
+
+# HTTP
+http_request_duration = histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ('route', 'method', 'status'))
+http_requests_in_flight = gauge(
+    'http_requests_in_flight', 'HTTP requests currently being handled', ('route',))
+app_errors = counter('app_errors_total', 'Errors handled by route handlers', ('route',))
+
+# LLM calls
+llm_call_duration = histogram(
+    'llm_call_duration_seconds', 'LLM call latency by call site, including retries', ('call_site',))
+llm_calls = counter(
+    'llm_calls_total', 'LLM calls by call site and outcome', ('call_site', 'outcome'))
+llm_calls_in_flight = gauge(
+    'llm_calls_in_flight', 'LLM calls currently in progress', ('call_site',))
+llm_retries = counter('llm_retries_total', 'LLM call retries by call site', ('call_site',))
+llm_hedges = counter('llm_hedges_total', 'Hedged LLM requests sent by call site', ('call_site',))
+llm_tokens = counter(
+    'llm_tokens_total', 'LLM tokens by call site and kind (prompt or completion)', ('call_site', 'kind'))
+
+# Caches
+cache_requests = counter('cache_requests_total', 'Cache lookups by cache and result', ('cache', 'result'))
+
+
+def record_cache(cache: str, hit: bool):
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def _cache_hit_ratios(values: dict):
+    caches = sorted({cache for cache, _ in values})
+    if not caches:
+        return
+    yield '# HELP cache_hit_ratio Fraction of cache lookups that were hits'
+    yield '# TYPE cache_hit_ratio gauge'
+    for cache in caches:
+        hits = values.get((cache, 'hit'), 0)
+        total = hits + values.get((cache, 'miss'), 0)
+        yield f'cache_hit_ratio{_format_labels(("cache",), (cache,))} {_format_value(hits / total if total else 0)}'
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    pid INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (pid, name, labels)
+);
+"""
+
+# Counter and histogram values of exited processes are folded into this pid
+_EXITED_PID = 0
+
+_db_lock = threading.Lock()
+_initialized = False
+_flushed_pid = None  # pid whose rows this process last wrote
+_flusher_pid = None  # pid of the process whose flusher thread is running
+_flusher_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    global _initialized
+    conn = sqlite3.connect(METRICS_DB, timeout=5, isolation_level=None)
+    if not _initialized:
+        with _db_lock:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            _initialized = True
+    return conn
+
+
+def _registered() -> Dict[str, _Metric]:
+    with _registry_lock:
+        return {metric.name: metric for metric in _registry}
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _retire(conn: sqlite3.Connection, pid: int, registered: Dict[str, _Metric]):
+    """Fold an exited process's counters and histograms into the _EXITED_PID rows and drop its gauges."""
+    rows = conn.execute('SELECT name, labels, value FROM samples WHERE pid = ?', (pid,)).fetchall()
+    for name, labels, value in rows:
+        metric = registered.get(name)
+        if metric is None or not metric.persistent:
+            continue
+        row = conn.execute('SELECT value FROM samples WHERE pid = ? AND name = ? AND labels = ?',
+                           (_EXITED_PID, name, labels)).fetchone()
+        value = json.loads(value)
+        if row is not None:
+            value = metric.combine(json.loads(row[0]), value)
+        conn.execute('INSERT OR REPLACE INTO samples (pid, name, labels, value) VALUES (?, ?, ?, ?)',
+                     (_EXITED_PID, name, labels, json.dumps(value)))
+    conn.execute('DELETE FROM samples WHERE pid = ?', (pid,))
+
+
+def _flush(conn: sqlite3.Connection, registered: Dict[str, _Metric]):
+    """Replace this process's rows with its current values."""
+    global _flushed_pid
+    pid = os.getpid()
+    rows = [(pid, metric.name, json.dumps(key), json.dumps(value))
+            for metric in registered.values() for key, value in metric.snapshot().items()]
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if _flushed_pid != pid:
+            # Rows under this pid belong to an exited process that had it before
+            _retire(conn, pid, registered)
+            _flushed_pid = pid
+        conn.execute('DELETE FROM samples WHERE pid = ?', (pid,))
+        conn.executemany('INSERT INTO samples (pid, name, labels, value) VALUES (?, ?, ?, ?)', rows)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def flush():
+    """Write this process's metrics to METRICS_DB."""
+    if not METRICS_MULTIPROCESS:
+        return
+    conn = _connect()
+    try:
+        _flush(conn, _registered())
+    finally:
+        conn.close()
+
+
+def _collect(registered: Dict[str, _Metric]) -> Dict[str, dict]:
+    """Combined values of every live process and the retired totals, by metric name."""
+    conn = _connect()
+    try:
+        _flush(conn, registered)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for (pid,) in conn.execute('SELECT DISTINCT pid FROM samples').fetchall():
+                if pid != _EXITED_PID and not _alive(pid):
+                    _retire(conn, pid, registered)
+            rows = conn.execute('SELECT name, labels, value FROM samples').fetchall()
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    finally:
+        conn.close()
+
+    values = {name: {} for name in registered}
+    for name, labels, value in rows:
+        metric = registered.get(name)
+        if metric is None:
+            continue
+        key, value = tuple(json.loads(labels)), json.loads(value)
+        series = values[name]
+        series[key] = metric.combine(series[key], value) if key in series else value
+    return values
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            flush()
+        except Exception as e:
+            print(f"Error flushing metrics: {str(e)}")
+
+
+def _start_flusher():
+    global _flusher_pid
+    pid = os.getpid()
+    with _flusher_lock:
+        if _flusher_pid == pid:
+            return
+        _flusher_pid = pid
+    threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+
+
+def _ensure_flusher():
+    # Started on first use rather than at import or fork, so a process that
+    # never records a metric (such as a subprocess child) never gets a thread.
+    # A forked child sees a pid other than the one its inherited flag refers to.
+    if METRICS_MULTIPROCESS and _flusher_pid != os.getpid():
+        _start_flusher()
+
+
+def _after_fork():
+    # A forked worker starts from zero; its parent still reports what it counted before the fork.
+    # Only locks and values are reset here; no thread is started in the child.
+    global _flusher_lock, _db_lock, _registry_lock
+    _db_lock = threading.Lock()
+    _registry_lock = threading.Lock()
+    _flusher_lock = threading.Lock()
+    for metric in _registry:
+        metric._reset()
+
+
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception as e:
+        print(f"Error flushing metrics: {str(e)}")
+
+
+if METRICS_MULTIPROCESS:
+    atexit.register(_flush_at_exit)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_after_fork)
+
+
+def render() -> str:
+    """
+    Render every registered metric in the Prometheus text exposition format
+
+    With METRICS_MULTIPROCESS, values are combined across every worker on the
+    host: counters and histograms are summed (including exited workers), and
+    gauges of live workers are summed or maxed per their multiprocess_mode.
+    """
+    _ensure_flusher()
+    registered = _registered()
+    values: Optional[Dict[str, dict]] = None
+    if METRICS_MULTIPROCESS:
+        try:
+            values = _collect(registered)
+        except Exception as e:
+            print(f"Error combining metrics across workers, reporting this worker only: {str(e)}")
+    if values is None:
+        values = {name: metric.snapshot() for name, metric in registered.items()}
+    lines = []
+    for name, metric in registered.items():
+        lines.extend(metric.render(values[name]))
+    lines.extend(_cache_hit_ratios(values[cache_requests.name]))
+    return '\n'.join(lines) + '\n'
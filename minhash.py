@@ -0,0 +1,81 @@
+import hashlib
+import random
+import re
+from typing import List, Optional, Set, Tuple
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    """Overlapping runs of `size` normalized words."""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """
+    Computes fixed-length MinHash signatures of text
+
+    Uses one-permutation hashing: each shingle is hashed once, the hash picks
+    one of num_perm bins and the signature keeps each bin's minimum. Bins no
+    shingle fell into are filled from other bins by optimal densification
+    (Shrivastava, 2017): an empty bin probes a fixed, seeded sequence of bins
+    and takes the first filled one's minimum. Two signatures still agree on a
+    position with probability equal to the texts' Jaccard similarity. A
+    signature costs one hash per shingle instead of num_perm.
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._salt = seed.to_bytes(16, 'big')
+        # The same probe order for every text, so densified positions stay comparable
+        self._probes = [rng.sample(range(num_perm), num_perm) for _ in range(num_perm)]
+
+    def _hash(self, shingle: str) -> int:
+        return int.from_bytes(
+            hashlib.blake2b(shingle.encode('utf-8'), digest_size=8, salt=self._salt).digest(), 'big')
+
+    def signature(self, text: str) -> Optional[Tuple[int, ...]]:
+        """
+        MinHash signature of a text's word shingles
+
+        Returns:
+            Optional[Tuple[int, ...]]: num_perm minimums, or None for text without words
+        """
+        items = shingles(text)
+        if not items:
+            return None
+        bins = [None] * self.num_perm
+        for shingle in items:
+            value, slot = divmod(self._hash(shingle), self.num_perm)
+            if bins[slot] is None or value < bins[slot]:
+                bins[slot] = value
+        filled = list(bins)
+        for slot, value in enumerate(filled):
+            if value is None:
+                bins[slot] = next(filled[probe] for probe in self._probes[slot] if filled[probe] is not None)
+        return tuple(bins)
+
+
+def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+
+def lsh_buckets(signature: Tuple[int, ...], bands: int) -> List[str]:
+    """
+    Locality-sensitive hash buckets of a signature, one per band
+
+    The signature is split into `bands` equal runs of rows. Two signatures
+    share a bucket when they agree on every row of a band, so only questions
+    sharing a bucket need to be compared.
+    """
+    rows = len(signature) // bands
+    buckets = []
+    for band in range(bands):
+        values = ','.join(str(value) for value in signature[band * rows:(band + 1) * rows])
+        buckets.append(f"{band}:{hashlib.blake2b(values.encode('ascii'), digest_size=8).hexdigest()}")
+    return buckets
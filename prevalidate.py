@@ -0,0 +1,234 @@
+import math
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional, Tuple
+
+import metrics
+import tracing
+
+PREVALIDATE_ENABLED = os.getenv('PREVALIDATE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+PREVALIDATE_TIMEOUT = float(os.getenv('PREVALIDATE_TIMEOUT', '10'))
+_pool = ThreadPoolExecutor(max_workers=int(os.getenv('PREVALIDATE_WORKERS', '4')),
+                           thread_name_prefix='prevalidate')
+
+prevalidations = metrics.counter(
+    'prevalidation_total', 'Local syntax checks by language and outcome', ('lang', 'outcome'))
+
+PASSED = 'passed'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+def _check_python(code: str) -> Tuple[str, str]:
+    # compile() runs the parser and the compiler's own checks (e.g. 'return'
+    # outside a function) without executing anything
+    try:
+        compile(code, 'main.py', 'exec', dont_inherit=True)
+    except SyntaxError as e:
+        lines = [f'  File "main.py", line {e.lineno}']
+        if e.text:
+            lines.append(f'    {e.text.rstrip()}')
+            if e.offset:
+                lines.append('    ' + ' ' * (e.offset - 1) + '^')
+        lines.append(f'{type(e).__name__}: {e.msg}')
+        return FAILED, '\n'.join(lines)
+    except ValueError as e:
+        # Source containing null bytes
+        return FAILED, f'SyntaxError: {str(e)}'
+    return PASSED, ''
+
+
+# Preprocessor directives that read another file. '%:' and '??=' are the digraph
+# and trigraph spellings of '#'; comments may sit between '#' and the name
+_FILE_DIRECTIVE = re.compile(
+    r'^[ \t]*(?:#|%:|\?\?=)(?:[ \t]|/\*.*?\*/)*(include_next|include|import|embed)\b'
+    r'(?:[ \t]|/\*.*?\*/)*([^\n]*)', re.M)
+# A standard header named relative to the system include path, e.g. <vector> or <bits/stdc++.h>
+_SYSTEM_HEADER = re.compile(r'<([A-Za-z0-9_+-][A-Za-z0-9_+.-]*(?:/[A-Za-z0-9_+-][A-Za-z0-9_+.-]*)*)>')
+_TRAILING_COMMENTS = re.compile(r'/\*.*?\*/|//.*$')
+_RAW_PREFIXES = ('R', 'uR', 'UR', 'LR', 'u8R')
+
+
+def _strip_comments(code: str, keep_lines: bool) -> str:
+    """
+    Replace comments with whitespace, leaving literals as they are
+
+    With keep_lines, a comment spanning lines leaves its line breaks behind,
+    otherwise it becomes one space. Raw strings and digit separators are
+    recognised so a quote can't hide the start or end of a comment.
+    """
+    out = []
+    i, n = 0, len(code)
+    while i < n:
+        c = code[i]
+        if code.startswith('//', i):
+            end = code.find('\n', i)
+            i = n if end < 0 else end
+            out.append(' ')
+        elif code.startswith('/*', i):
+            end = code.find('*/', i + 2)
+            end = n if end < 0 else end + 2
+            out.append(' ' + '\n' * code.count('\n', i, end) if keep_lines else ' ')
+            i = end
+        elif c in '"\'':
+            # The identifier or number this quote follows, if any
+            start = i
+            while start > 0 and (code[start - 1].isalnum() or code[start - 1] in '_.'):
+                start -= 1
+            prefix = code[start:i]
+            if c == '\'' and (prefix[:1].isdigit() or (prefix[:1] == '.' and prefix[1:2].isdigit())):
+                # Digit separator, as in 1'000'000
+                out.append(c)
+                i += 1
+                continue
+            if c == '"' and prefix in _RAW_PREFIXES:
+                paren = code.find('(', i + 1)
+                if paren >= 0:
+                    close = code.find(')' + code[i + 1:paren] + '"', paren)
+                    end = n if close < 0 else close + paren - i + 1
+                    out.append(code[i:end])
+                    i = end
+                    continue
+            j = i + 1
+            while j < n and code[j] not in (c, '\n'):
+                j += 2 if code[j] == '\\' else 1
+            end = min(j + 1, n) if j < n and code[j] == c else j
+            out.append(code[i:end])
+            i = end
+        else:
+            out.append(c)
+            i += 1
+    return ''.join(out)
+
+
+def _disallowed_include(code: str) -> Optional[str]:
+    """The first directive that reads anything but a standard header, or None."""
+    spliced = code.replace('\\\r\n', '').replace('\\\n', '')
+    # Whether a directive follows a multi-line comment on the same line or is split
+    # by one, one of the stripped texts shows it; the plain text is checked as well
+    # in case a literal throws off comment stripping
+    for text in (spliced, _strip_comments(spliced, True), _strip_comments(spliced, False)):
+        for match in _FILE_DIRECTIVE.finditer(text):
+            directive, operand = match.group(1), match.group(2).strip()
+            header = _SYSTEM_HEADER.match(operand)
+            if (directive == 'include' and header
+                    and not any(part in ('.', '..') for part in header.group(1).split('/'))
+                    and not _TRAILING_COMMENTS.sub('', operand[header.end():]).strip()):
+                continue
+            return f'#{directive} {operand}'[:80]
+    return None
+
+
+def include_error(code: str) -> Optional[str]:
+    """
+    Compiler-style error for C++ code that includes anything but a standard header
+
+    g++ echoes lines of files it can't parse, so local files must never be included.
+
+    Returns:
+        Optional[str]: The error message, or None if every include is allowed
+    """
+    directive = _disallowed_include(code)
+    if directive is None:
+        return None
+    return (f"main.cpp: error: '{directive}' is not allowed; only standard library "
+            "headers such as #include <vector> can be included")
+
+
+def _check_cpp(code: str) -> Tuple[str, str]:
+    compiler = shutil.which(os.getenv('CXX', 'g++'))
+    if not compiler:
+        return SKIPPED, 'g++ not available'
+    error = include_error(code)
+    if error:
+        return FAILED, error
+    import sandbox
+    with tempfile.TemporaryDirectory(prefix='prevalidate-') as workdir:
+        with open(os.path.join(workdir, 'main.cpp'), 'w') as file:
+            file.write(code)
+        # An empty directory, a clean environment and the sandbox's rlimits
+        proc = subprocess.run(
+            [compiler, '-fsyntax-only', '-std=c++17', 'main.cpp'],
+            cwd=workdir, capture_output=True, text=True, timeout=PREVALIDATE_TIMEOUT,
+            env={'PATH': os.environ.get('PATH', '/usr/bin:/bin'), 'LANG': 'C.UTF-8'},
+            preexec_fn=sandbox._limits(math.ceil(PREVALIDATE_TIMEOUT), True, None)
+        )
+    if proc.returncode == 0:
+        return PASSED, ''
+    return FAILED, proc.stderr.strip()
+
+
+def java_class_name(code: str) -> str:
+    """Name of the public class, which javac requires to live in a file of the same name."""
+    match = re.search(r'public\s+(?:final\s+|abstract\s+)*class\s+(\w+)', code)
+    return match.group(1) if match else 'Main'
+
+
+def _check_java(code: str) -> Tuple[str, str]:
+    javac = shutil.which('javac')
+    if not javac:
+        return SKIPPED, 'javac not available'
+    filename = f'{java_class_name(code)}.java'
+    with tempfile.TemporaryDirectory(prefix='prevalidate-') as workdir:
+        path = os.path.join(workdir, filename)
+        with open(path, 'w') as file:
+            file.write(code)
+        proc = subprocess.run(
+            [javac, '-proc:none', '-nowarn', '-d', workdir, path],
+            capture_output=True, text=True, timeout=PREVALIDATE_TIMEOUT
+        )
+    if proc.returncode == 0:
+        return PASSED, ''
+    return FAILED, proc.stderr.replace(path, filename).strip()
+
+
+_CHECKERS = {
+    'python': _check_python,
+    'cpp': _check_cpp,
+    'java': _check_java,
+}
+
+
+def check_syntax(code: str, lang: str) -> Tuple[str, str]:
+    """
+    Check code with the local toolchain before it reaches the model
+
+    Args:
+        code (str): Source code
+        lang (str): 'python', 'cpp' or 'java'
+
+    Returns:
+        Tuple[str, str]: (PASSED, ''), (FAILED, diagnostics) or (SKIPPED, reason)
+        when the language or toolchain isn't available or the check timed out
+    """
+    checker = _CHECKERS.get(lang)
+    if not PREVALIDATE_ENABLED or checker is None:
+        return SKIPPED, 'no local checker'
+
+    with tracing.span('prevalidate', lang=lang) as span:
+        try:
+            outcome, detail = _pool.submit(checker, code).result(timeout=PREVALIDATE_TIMEOUT)
+        except (FutureTimeoutError, subprocess.TimeoutExpired):
+            outcome, detail = SKIPPED, 'check timed out'
+        except Exception as e:
+            print(f"Error prevalidating {lang} code: {str(e)}")
+            outcome, detail = SKIPPED, str(e)
+        span.set_attribute('outcome', outcome)
+    prevalidations.inc(lang=lang, outcome=outcome)
+    return outcome, detail
+
+
+def compile_failure(code: str, lang: str) -> Optional[dict]:
+    """Return a compile_code style failure if the code doesn't compile locally, else None."""
+    outcome, diagnostics = check_syntax(code, lang)
+    if outcome != FAILED:
+        return None
+    return {
+        'result': 'SyntaxError' if lang == 'python' else 'Failure',
+        'message': diagnostics,
+        'corrected_code': None
+    }
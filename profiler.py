@@ -0,0 +1,265 @@
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, OrderedDict
+from typing import Optional, Tuple
+
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '60'))
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.005'))
+TRACEMALLOC_FRAMES = int(os.getenv('TRACEMALLOC_FRAMES', '25'))
+# Finished CPU profiles are written here so any worker on the host can serve them
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'gencode-profiles'))
+PROFILE_LIMIT = int(os.getenv('PROFILE_LIMIT', '10'))
+# Memory snapshots kept for diffing
+SNAPSHOT_LIMIT = int(os.getenv('SNAPSHOT_LIMIT', '5'))
+
+_profile_lock = threading.Lock()
+_PROFILE_ID = re.compile(r'^[0-9a-f]{12}$')
+_snapshots = OrderedDict()  # snapshot id -> (taken_at, tracemalloc.Snapshot)
+_snapshots_lock = threading.Lock()
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a CPU profile is already running in this process."""
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+
+
+def _sample(seconds: float, interval: float = PROFILE_INTERVAL) -> dict:
+    """
+    Sample every other thread's stack for a bounded time
+
+    Returns:
+        dict: collapsed stack -> sample count, in the format flamegraph.pl reads
+    """
+    own_thread = threading.get_ident()
+    thread_names = {}
+    stacks = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if len(thread_names) != threading.active_count():
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            stack.append(thread_names.get(thread_id, str(thread_id)))
+            stacks[';'.join(reversed(stack))] += 1
+        time.sleep(interval)
+    return dict(stacks)
+
+
+def collapsed(stacks: dict) -> str:
+    """Render sampled stacks as 'frame;frame;frame count' lines."""
+    return ''.join(f'{stack} {count}\n' for stack, count in sorted(stacks.items()))
+
+
+def _profile_path(profile_id: str, suffix: str) -> str:
+    return os.path.join(PROFILE_DIR, profile_id + suffix)
+
+
+def _prune_profiles():
+    try:
+        names = [name for name in os.listdir(PROFILE_DIR) if name.endswith('.txt')]
+    except FileNotFoundError:
+        return
+    paths = sorted((os.path.join(PROFILE_DIR, name) for name in names), key=os.path.getmtime)
+    for path in paths[:max(0, len(paths) - PROFILE_LIMIT)]:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _run_profile(profile_id: str, seconds: float):
+    try:
+        output = collapsed(_sample(seconds))
+        fd, tmp_path = tempfile.mkstemp(dir=PROFILE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'w') as file:
+            file.write(output)
+        os.replace(tmp_path, _profile_path(profile_id, '.txt'))
+        _prune_profiles()
+    except Exception as e:
+        print(f"Error writing CPU profile {profile_id}: {str(e)}")
+    finally:
+        try:
+            os.unlink(_profile_path(profile_id, '.running'))
+        except OSError:
+            pass
+        _profile_lock.release()
+
+
+def start_profile(seconds: float) -> dict:
+    """
+    Start sampling this process in a background thread
+
+    Args:
+        seconds (float): Sampling duration, capped at PROFILE_MAX_SECONDS
+
+    Returns:
+        dict: The profile id, the sampled process and the duration
+
+    Raises:
+        ProfilerBusyError: If a profile is already running in this process
+    """
+    seconds = max(0.0, min(seconds, PROFILE_MAX_SECONDS))
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError('A CPU profile is already running')
+    try:
+        profile_id = uuid.uuid4().hex[:12]
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        # Marks the profile as running for workers that didn't start it
+        open(_profile_path(profile_id, '.running'), 'w').close()
+        threading.Thread(target=_run_profile, args=(profile_id, seconds),
+                         name='cpu-profiler', daemon=True).start()
+    except BaseException:
+        _profile_lock.release()
+        raise
+    return {'profile_id': profile_id, 'pid': os.getpid(), 'seconds': seconds}
+
+
+def get_profile(profile_id: str) -> Optional[Tuple[str, str]]:
+    """
+    State of a profile started by any worker on this host
+
+    Returns:
+        Optional[Tuple[str, str]]: ('done', collapsed stacks), ('running', ''),
+        or None if the id is unknown
+    """
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(_profile_path(profile_id, '.txt')) as file:
+            return 'done', file.read()
+    except FileNotFoundError:
+        pass
+    return ('running', '') if os.path.exists(_profile_path(profile_id, '.running')) else None
+
+
+def memory_usage() -> dict:
+    """Current and peak resident set size of this process, in bytes."""
+    usage = {}
+    try:
+        with open('/proc/self/statm') as file:
+            usage['rss_bytes'] = int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        usage['peak_rss_bytes'] = peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        pass
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        usage['traced_bytes'] = current
+        usage['traced_peak_bytes'] = peak
+    return usage
+
+
+def _stat_dict(stat) -> dict:
+    frame = stat.traceback[0]
+    return {
+        'location': f'{frame.filename}:{frame.lineno}',
+        'size_bytes': stat.size,
+        'count': stat.count,
+    }
+
+
+def _diff_dict(stat) -> dict:
+    frame = stat.traceback[0]
+    return {
+        'location': f'{frame.filename}:{frame.lineno}',
+        'size_bytes': stat.size,
+        'size_diff_bytes': stat.size_diff,
+        'count': stat.count,
+        'count_diff': stat.count_diff,
+    }
+
+
+def take_snapshot(limit: int = 20) -> dict:
+    """
+    Take a tracemalloc snapshot, starting tracing on first use
+
+    Snapshots are kept in the process that took them; the id starts with its pid.
+
+    Returns:
+        dict: The snapshot id, the worker pid and its top allocation sites
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ))
+    snapshot_id = f'{os.getpid()}-{uuid.uuid4().hex[:12]}'
+    with _snapshots_lock:
+        _snapshots[snapshot_id] = (time.time(), snapshot)
+        while len(_snapshots) > SNAPSHOT_LIMIT:
+            _snapshots.popitem(last=False)
+    return {
+        'snapshot_id': snapshot_id,
+        'pid': os.getpid(),
+        'memory': memory_usage(),
+        'top': [_stat_dict(stat) for stat in snapshot.statistics('lineno')[:limit]],
+    }
+
+
+def diff_snapshots(from_id: str, to_id: Optional[str] = None, limit: int = 20) -> Optional[dict]:
+    """
+    Compare two snapshots by allocation site
+
+    Args:
+        from_id (str): Baseline snapshot id
+        to_id (Optional[str]): Snapshot to compare; a new one is taken if omitted
+
+    Returns:
+        Optional[dict]: Largest allocation changes, or None if a snapshot id is unknown
+    """
+    if to_id is None:
+        to_id = take_snapshot(limit=0)['snapshot_id']
+    with _snapshots_lock:
+        baseline = _snapshots.get(from_id)
+        current = _snapshots.get(to_id)
+    if baseline is None or current is None:
+        return None
+    stats = current[1].compare_to(baseline[1], 'lineno')
+    return {
+        'from': from_id,
+        'to': to_id,
+        'pid': os.getpid(),
+        'elapsed_seconds': round(current[0] - baseline[0], 3),
+        'memory': memory_usage(),
+        'top': [_diff_dict(stat) for stat in stats[:limit]],
+    }
+
+
+def snapshot_pid(snapshot_id: str) -> Optional[int]:
+    """The pid of the worker that took a snapshot, or None if the id isn't one of ours."""
+    pid, _, _ = snapshot_id.partition('-')
+    return int(pid) if pid.isdigit() else None
+
+
+def list_snapshots() -> list:
+    with _snapshots_lock:
+        return [{'snapshot_id': sid, 'taken_at': taken_at} for sid, (taken_at, _) in _snapshots.items()]
+
+
+def stop_tracing():
+    """Stop tracemalloc and drop stored snapshots."""
+    with _snapshots_lock:
+        _snapshots.clear()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
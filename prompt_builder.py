@@ -0,0 +1,248 @@
+import io
+import os
+import re
+import tokenize
+from typing import Optional, Tuple
+
+import metrics
+
+
+def _budget(route: str, max_tokens: int, policy: str) -> dict:
+    """Read PROMPT_BUDGET_<ROUTE> and PROMPT_POLICY_<ROUTE> overrides."""
+    return {
+        'max_tokens': int(os.getenv(f'PROMPT_BUDGET_{route.upper()}', max_tokens)),
+        'policy': os.getenv(f'PROMPT_POLICY_{route.upper()}', policy),
+    }
+
+
+# Token budgets for the user-supplied part of each prompt. 'reject' refuses
+# oversized input; 'truncate' cuts context fields down to fit.
+PROMPT_BUDGETS = {
+    # Truncated code can't be compiled meaningfully
+    'compile': _budget('compile', 8000, 'reject'),
+    'submit': _budget('submit', 16000, 'truncate'),
+}
+
+prompt_size = metrics.histogram(
+    'prompt_input_tokens', 'Estimated tokens of user input per prompt, before and after compaction',
+    ('route', 'stage'), buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000))
+budget_actions = metrics.counter(
+    'prompt_budget_actions_total', 'Prompts rejected or truncated for exceeding their budget',
+    ('route', 'action'))
+
+
+class PromptTooLargeError(ValueError):
+    """Raised when user input exceeds a route's token budget."""
+
+    # Resubmitting the same input can't succeed
+    retryable = False
+
+    def __init__(self, route: str, tokens: int, budget: int):
+        super().__init__(
+            f'Input is too large: about {tokens} tokens, but at most {budget} are allowed. '
+            'Please shorten your code or remove large test data.'
+        )
+        self.route = route
+        self.tokens = tokens
+        self.budget = budget
+
+    def __reduce__(self):
+        # Job workers send exceptions back to the parent process by pickling
+        return type(self), (self.route, self.tokens, self.budget)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for code and English text (about 4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def _strip_python_comments(code: str) -> str:
+    comments = {}  # line number -> column where the comment starts
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(code).readline):
+            if token.type == tokenize.COMMENT:
+                comments[token.start[0]] = token.start[1]
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        # Leave code the tokenizer can't read untouched
+        return code
+    lines = code.split('\n')
+    for lineno, col in comments.items():
+        lines[lineno - 1] = lines[lineno - 1][:col]
+    return '\n'.join(lines)
+
+
+_C_SPECIAL = re.compile(r'//|/\*|R"|"|\'')
+_RAW_STRING_OPEN = re.compile(r'R"([^()\\\s]{0,16})\(')
+
+
+def _follows_number(code: str, pos: int) -> bool:
+    """Whether the identifier or number ending at pos is a number, as before a digit separator."""
+    start = pos
+    while start > 0 and (code[start - 1].isalnum() or code[start - 1] in '_.'):
+        start -= 1
+    head = code[start:start + 2]
+    return head[:1].isdigit() or (head[:1] == '.' and head[1:].isdigit())
+
+
+def _strip_c_comments(code: str) -> str:
+    """Remove // and /* */ comments, leaving string, char and raw string literals intact."""
+    out = []
+    i = 0
+    n = len(code)
+    while i < n:
+        match = _C_SPECIAL.search(code, i)
+        if match is None:
+            out.append(code[i:])
+            break
+        start = match.start()
+        out.append(code[i:start])
+        token = match.group()
+        if token == '//':
+            end = code.find('\n', start)
+            i = n if end == -1 else end
+        elif token == '/*':
+            end = code.find('*/', start + 2)
+            end = n if end == -1 else end + 2
+            # Keep the comment's newlines so line numbers don't shift
+            out.append('\n' * code.count('\n', start, end) or ' ')
+            i = end
+        elif token == 'R"':
+            raw = _RAW_STRING_OPEN.match(code, start)
+            identifier_char = start > 0 and (code[start - 1].isalnum() or code[start - 1] == '_')
+            if raw is None or identifier_char:
+                out.append('R')
+                i = start + 1
+                continue
+            close = ')' + raw.group(1) + '"'
+            end = code.find(close, raw.end())
+            end = n if end == -1 else end + len(close)
+            out.append(code[start:end])
+            i = end
+        elif token == '\'' and _follows_number(code, start):
+            # Digit separator, as in 1'000'000
+            out.append(token)
+            i = start + 1
+        else:
+            # String or char literal; stops at the closing quote or end of line
+            j = start + 1
+            while j < n and code[j] != token and code[j] != '\n':
+                j += 2 if code[j] == '\\' else 1
+            end = min(j + 1, n) if j < n and code[j] == token else j
+            out.append(code[start:end])
+            i = end
+    return ''.join(out)
+
+
+def strip_comments(code: str, lang: str) -> str:
+    """Remove comments without changing the code's line structure."""
+    if lang == 'python':
+        return _strip_python_comments(code)
+    if lang in ('cpp', 'c', 'java', 'javascript', 'csharp'):
+        return _strip_c_comments(code)
+    return code
+
+
+def _collapse_blank_lines(text: str) -> str:
+    return re.sub(r'\n{3,}', '\n\n', text)
+
+
+def compact_code(code: str, lang: str, preserve_lines: bool = False) -> str:
+    """
+    Strip comments and redundant whitespace from code
+
+    Args:
+        code (str): Source code
+        lang (str): Language of the code
+        preserve_lines (bool): Keep every line so reported line numbers still match
+
+    Returns:
+        str: The compacted code
+    """
+    code = strip_comments(code, lang)
+    code = '\n'.join(line.rstrip() for line in code.split('\n'))
+    if not preserve_lines:
+        code = _collapse_blank_lines(code).strip('\n')
+    return code
+
+
+def compact_text(text: str) -> str:
+    """Strip trailing whitespace and runs of blank lines from prose."""
+    text = '\n'.join(line.rstrip() for line in text.split('\n'))
+    return _collapse_blank_lines(text).strip()
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens, keeping its beginning and end."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    keep = max(0, max_tokens * 4 - 64)
+    head = text[:keep * 2 // 3]
+    tail = text[len(text) - keep // 3:] if keep // 3 else ''
+    omitted = text.count('\n', len(head), len(text) - len(tail))
+    return f'{head}\n... [{omitted} lines truncated] ...\n{tail}'
+
+
+def _record(route: str, raw: int, compacted: int):
+    prompt_size.observe(raw, route=route, stage='raw')
+    prompt_size.observe(compacted, route=route, stage='compacted')
+
+
+def build_compile_input(code: str, lang: str) -> str:
+    """
+    Compact code for the compile prompt and enforce the compile budget
+
+    Line structure is preserved so the simulated compiler's line numbers
+    match the user's editor.
+    """
+    budget = PROMPT_BUDGETS['compile']
+    compacted = compact_code(code, lang, preserve_lines=True)
+    tokens = estimate_tokens(compacted)
+    _record('compile', estimate_tokens(code), tokens)
+    if tokens <= budget['max_tokens']:
+        return compacted
+    if budget['policy'] == 'truncate':
+        budget_actions.inc(route='compile', action='truncate')
+        return truncate(compacted, budget['max_tokens'])
+    budget_actions.inc(route='compile', action='reject')
+    raise PromptTooLargeError('compile', tokens, budget['max_tokens'])
+
+
+def build_submit_inputs(description: str, actualSolution: str, typedSolution: str,
+                        lang: str, reference_lang: Optional[str] = None) -> Tuple[str, str, str]:
+    """
+    Compact the fields of a grading prompt and enforce the submit budget
+
+    With the 'truncate' policy the description and reference solution are
+    shortened to make room; the submitted solution is never truncated.
+
+    Args:
+        lang (str): Language of the submitted solution
+        reference_lang (Optional[str]): Language of the reference solution. When
+            unknown, its comments are left in rather than stripped by the wrong rules
+
+    Returns:
+        Tuple[str, str, str]: (description, actualSolution, typedSolution)
+    """
+    budget = PROMPT_BUDGETS['submit']
+    raw = estimate_tokens(description or '') + estimate_tokens(actualSolution or '') + estimate_tokens(typedSolution)
+    description = compact_text(description or '')
+    actualSolution = compact_code(actualSolution or '', reference_lang or '')
+    typedSolution = compact_code(typedSolution, lang)
+
+    typed_tokens = estimate_tokens(typedSolution)
+    context_tokens = estimate_tokens(description) + estimate_tokens(actualSolution)
+    _record('submit', raw, typed_tokens + context_tokens)
+    if typed_tokens + context_tokens <= budget['max_tokens']:
+        return description, actualSolution, typedSolution
+
+    room = budget['max_tokens'] - typed_tokens
+    if budget['policy'] != 'truncate' or room <= 0:
+        budget_actions.inc(route='submit', action='reject')
+        raise PromptTooLargeError('submit', typed_tokens + context_tokens, budget['max_tokens'])
+
+    budget_actions.inc(route='submit', action='truncate')
+    # Split the remaining room between the context fields in proportion to their size
+    description_room = room * estimate_tokens(description) // max(1, context_tokens)
+    return (truncate(description, description_room),
+            truncate(actualSolution, room - description_room),
+            typedSolution)
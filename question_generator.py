@@ -1,5 +1,24 @@
+import contextvars
+import os
 import re
-from config import llm
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+
+import llm_client
+import question_store
+import tracing
+
+# Languages the C++ reference solution is ported to after generation
+SOLUTION_LANGUAGES = [lang.strip() for lang in os.getenv('SOLUTION_LANGUAGES', 'python,java').split(',')
+                      if lang.strip()]
+_pool = ThreadPoolExecutor(max_workers=int(os.getenv('SOLUTION_WORKERS', '8')),
+                           thread_name_prefix='solutions')
+
+_LANGUAGE_NAMES = {'cpp': 'C++', 'python': 'Python 3', 'java': 'Java'}
+_LANGUAGE_RULES = {
+    'python': '- Use only the standard library and read input the same way as the C++ version.',
+    'java': '- Put everything in a single file whose public class is named Main.',
+}
 
 def generate_dsa_question(topic: str) -> dict:
     prompt = f"""
@@ -80,8 +99,102 @@ def generate_dsa_question(topic: str) -> dict:
     ```
     [Note] Ensure that all sections are properly aligned and must add proper spacing between text and lines with '\n' with Markdown formatting.
     """
-    markdown = llm.invoke(prompt).content
+    markdown = llm_client.invoke('generate', prompt).content
+
+    with tracing.span('question.parse'):
+        question = parse_question_markdown(markdown)
+
+    # Reuse a stored near-duplicate, and its ported solutions, instead of keeping both;
+    # it comes back with its question_id already set
+    with tracing.span('question.dedup') as span:
+        duplicate = question_store.find_duplicate(question)
+        span.set_attribute('duplicate', duplicate is not None)
+    if duplicate is not None:
+        return duplicate
+    return add_solution_languages(question)
+
+
+def _code_block(markdown: str, heading: str, lang: str) -> str:
+    match = re.search(rf'## {heading}\s*\n```{lang}(.*?)```', markdown, re.DOTALL)
+    return match.group(1).strip() if match else ""
+
+
+def port_solution(question: dict, lang: str) -> Tuple[str, str]:
+    """
+    Port a question's C++ reference solution and starter code to another language
+
+    Returns:
+        Tuple[str, str]: (solution, initial_code), empty if the response couldn't be parsed
+    """
+    prompt = f"""
+You are an expert competitive programmer. Port the reference solution and starter template of the
+problem below from C++ to {_LANGUAGE_NAMES.get(lang, lang)}.
+- Keep the same algorithm, complexity, input format and output format.
+- The starter template must compile, keep the same main function test cases and give no hints.
+{_LANGUAGE_RULES.get(lang, '')}
+
+# Problem Statement
+{question['description']}
+
+## Reference Solution
+```cpp
+{question['solution']}
+```
+
+## Reference InitialCode
+```cpp
+{question['initial_code']}
+```
+
+Respond with exactly these two sections and nothing else:
+
+## Solution
+```{lang}
+[Solution code]
+```
+
+## InitialCode
+```{lang}
+[Starter template]
+```
+"""
+    markdown = llm_client.invoke('translate', prompt).content
+
+    with tracing.span('solution.parse', lang=lang):
+        return _code_block(markdown, 'Solution', lang), _code_block(markdown, 'InitialCode', lang)
+
+
+def add_solution_languages(question: dict) -> dict:
+    """
+    Add 'solutions' and 'initial_codes' keyed by language to a generated question
+
+    The ports run concurrently once the problem statement is fixed. A language
+    whose port fails is left out, and grading falls back to the C++ solution.
+    """
+    solutions = {'cpp': question['solution']}
+    initial_codes = {'cpp': question['initial_code']}
+    if question['solution']:
+        # Each port runs in a copy of the caller's context so its spans join the request trace
+        futures = {
+            lang: _pool.submit(contextvars.copy_context().run, port_solution, question, lang)
+            for lang in SOLUTION_LANGUAGES if lang != 'cpp'
+        }
+        for lang, future in futures.items():
+            try:
+                solution, initial_code = future.result()
+            except Exception as e:
+                print(f"Error porting solution to {lang}: {str(e)}")
+                continue
+            if solution:
+                solutions[lang] = solution
+                initial_codes[lang] = initial_code
+    question['solutions'] = solutions
+    question['initial_codes'] = initial_codes
+    return question
+
 
+def parse_question_markdown(markdown: str) -> dict:
+    """Split the generated markdown into the question's fields."""
     # Extract difficulty
     difficulty_match = re.search(r'^Difficulty:\s*(.+)', markdown, re.MULTILINE)
     difficulty = difficulty_match.group(1).strip() if difficulty_match else "Medium"
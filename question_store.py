@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+import metrics
+import minhash
+
+# SQLite file shared by every worker on the host, so a question_id handed out by
+# one worker is known to all of them
+QUESTION_STORE_DB = os.getenv('QUESTION_STORE_DB', 'questions.db')
+# Number of generated questions kept
+QUESTION_POOL_SIZE = int(os.getenv('QUESTION_POOL_SIZE', '200'))
+# Once a topic has this many distinct stored questions, serve from the pool
+# instead of generating more (0 always generates)
+QUESTIONS_PER_TOPIC = int(os.getenv('QUESTIONS_PER_TOPIC', '0'))
+# Estimated Jaccard similarity of problem statements above which a new
+# question counts as a duplicate of a stored one
+DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.8'))
+MINHASH_PERMUTATIONS = int(os.getenv('MINHASH_PERMUTATIONS', '64'))
+LSH_BANDS = int(os.getenv('LSH_BANDS', '16'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id TEXT PRIMARY KEY,
+    topic TEXT NOT NULL,
+    question TEXT NOT NULL,
+    signature TEXT,
+    added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_questions_topic ON questions (topic);
+CREATE INDEX IF NOT EXISTS idx_questions_added ON questions (added_at);
+CREATE TABLE IF NOT EXISTS question_buckets (
+    bucket TEXT NOT NULL,
+    id TEXT NOT NULL,
+    PRIMARY KEY (bucket, id)
+);
+CREATE INDEX IF NOT EXISTS idx_question_buckets_id ON question_buckets (id);
+"""
+
+_hasher = minhash.MinHasher(MINHASH_PERMUTATIONS)
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _connect() -> sqlite3.Connection:
+    global _initialized
+    conn = sqlite3.connect(QUESTION_STORE_DB, timeout=30, isolation_level=None)
+    if not _initialized:
+        with _init_lock:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            _initialized = True
+    return conn
+
+
+def question_id(question: dict) -> str:
+    """Stable id derived from a question's title and statement."""
+    content = f"{question.get('title', '')}\0{question.get('description', '')}"
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+
+
+def _signature(question: dict):
+    return _hasher.signature(question.get('description', ''))
+
+
+def _load(qid: str, question: str) -> dict:
+    return dict(json.loads(question), question_id=qid)
+
+
+def add_question(topic: str, question: dict) -> str:
+    """
+    Keep a generated question, evicting the oldest once the pool is full
+
+    Args:
+        topic (str): Topic the question was generated for
+        question (dict): Question as returned by generate_dsa_question
+
+    Returns:
+        str: The question id
+    """
+    qid = question_id(question)
+    signature = _signature(question)
+    stored = {key: value for key, value in question.items() if key != 'question_id'}
+    conn = _connect()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM question_buckets WHERE id = ?', (qid,))
+            conn.execute(
+                'INSERT OR REPLACE INTO questions (id, topic, question, signature, added_at) VALUES (?, ?, ?, ?, ?)',
+                (qid, topic, json.dumps(stored), json.dumps(signature) if signature else None, time.time())
+            )
+            if signature is not None:
+                conn.executemany('INSERT OR IGNORE INTO question_buckets (bucket, id) VALUES (?, ?)',
+                                 [(bucket, qid) for bucket in minhash.lsh_buckets(signature, LSH_BANDS)])
+            evicted = [(row[0],) for row in conn.execute(
+                'SELECT id FROM questions ORDER BY added_at DESC, rowid DESC LIMIT -1 OFFSET ?',
+                (QUESTION_POOL_SIZE,)
+            )]
+            conn.executemany('DELETE FROM questions WHERE id = ?', evicted)
+            conn.executemany('DELETE FROM question_buckets WHERE id = ?', evicted)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    finally:
+        conn.close()
+    return qid
+
+
+def get_question(qid: str) -> Optional[dict]:
+    """Get a stored question by id, with its question_id set."""
+    conn = _connect()
+    try:
+        row = conn.execute('SELECT question FROM questions WHERE id = ?', (qid,)).fetchone()
+    finally:
+        conn.close()
+    metrics.record_cache('question_pool', row is not None)
+    return _load(qid, row[0]) if row else None
+
+
+def find_duplicate(question: dict) -> Optional[dict]:
+    """
+    Find a stored question whose statement is a near-duplicate of this one
+
+    Returns:
+        Optional[dict]: The stored question with its question_id set, or None
+        if there's no close match
+    """
+    signature = _signature(question)
+    if signature is None:
+        return None
+    buckets = minhash.lsh_buckets(signature, LSH_BANDS)
+    conn = _connect()
+    try:
+        # Questions sharing a bucket agree on every row of at least one band
+        candidates = conn.execute(
+            'SELECT DISTINCT q.id, q.question, q.signature FROM question_buckets b '
+            'JOIN questions q ON q.id = b.id '
+            f"WHERE b.bucket IN ({', '.join('?' * len(buckets))})",
+            buckets
+        ).fetchall()
+    finally:
+        conn.close()
+    best = None
+    for qid, stored, stored_signature in candidates:
+        score = minhash.similarity(signature, json.loads(stored_signature))
+        if score >= DEDUP_THRESHOLD and (best is None or score > best[2]):
+            best = (qid, stored, score)
+    metrics.record_cache('question_dedup', best is not None)
+    return _load(best[0], best[1]) if best else None
+
+
+def get_reference_solution(qid: str, lang: str) -> Optional[Tuple[str, str]]:
+    """
+    Reference solution of a stored question in the given language
+
+    Returns:
+        Optional[Tuple[str, str]]: The solution and its language, which is C++
+        if there's none in the given language, or None if the question isn't stored
+    """
+    question = get_question(qid)
+    if question is None:
+        return None
+    solution = (question.get('solutions') or {}).get(lang)
+    if solution:
+        return solution, lang
+    return (question['solution'], 'cpp') if question.get('solution') else None
+
+
+def get_random_question(topic: Optional[str] = None) -> Optional[dict]:
+    """
+    Get a random stored question, preferring the given topic
+
+    Returns:
+        Optional[dict]: A question with its question_id set, or None if the pool is empty
+    """
+    conn = _connect()
+    try:
+        row = None
+        if topic:
+            row = conn.execute('SELECT id, question FROM questions WHERE topic = ? ORDER BY RANDOM() LIMIT 1',
+                               (topic,)).fetchone()
+        if row is None:
+            row = conn.execute('SELECT id, question FROM questions ORDER BY RANDOM() LIMIT 1').fetchone()
+    finally:
+        conn.close()
+    metrics.record_cache('question_pool', row is not None)
+    return _load(*row) if row else None
+
+
+def is_topic_full(topic: str) -> bool:
+    """Whether a topic has enough stored questions to be served from the pool."""
+    if QUESTIONS_PER_TOPIC <= 0:
+        return False
+    conn = _connect()
+    try:
+        (count,) = conn.execute('SELECT COUNT(*) FROM questions WHERE topic = ?', (topic,)).fetchone()
+    finally:
+        conn.close()
+    return count >= QUESTIONS_PER_TOPIC
+
+
+def topic_counts() -> dict:
+    """Number of stored questions per topic."""
+    conn = _connect()
+    try:
+        return dict(conn.execute('SELECT topic, COUNT(*) FROM questions GROUP BY topic').fetchall())
+    finally:
+        conn.close()
+
+
+def size() -> int:
+    conn = _connect()
+    try:
+        return conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0]
+    finally:
+        conn.close()
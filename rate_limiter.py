@@ -0,0 +1,178 @@
+import hashlib
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from functools import wraps
+from typing import Tuple
+
+from flask import request, jsonify, make_response
+
+# SQLite file shared by every worker on the host so limits hold across processes
+RATE_LIMIT_DB = os.getenv('RATE_LIMIT_DB', 'ratelimit.db')
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Take the client address from X-Forwarded-For as appended by our own proxies
+TRUST_PROXY = os.getenv('TRUST_PROXY', 'false').lower() in ('1', 'true', 'yes')
+# Number of proxies in front of the app that each append to X-Forwarded-For
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', '1'))
+# Comma-separated API keys issued to clients; only these identify a caller by key
+API_KEYS = {key.strip() for key in os.getenv('API_KEYS', '').split(',') if key.strip()}
+# LLM-backed requests allowed in flight per worker before shedding load
+MAX_INFLIGHT_REQUESTS = int(os.getenv('MAX_INFLIGHT_REQUESTS', '16'))
+
+
+def _limit(name: str, capacity: float, per_second: float) -> Tuple[float, float]:
+    """Read a '<capacity>,<per_second>' override from RATE_LIMIT_<NAME>."""
+    value = os.getenv(f'RATE_LIMIT_{name.upper()}')
+    if value:
+        capacity, per_second = (float(part) for part in value.split(','))
+    return capacity, per_second
+
+
+# Token bucket (burst capacity, refill tokens per second) per client and route
+RATE_LIMITS = {
+    'compiler': _limit('compiler', 10, 0.5),
+    'compiler_run': _limit('compiler_run', 5, 0.2),
+    'submit': _limit('submit', 5, 0.1),
+    'submit_batch': _limit('submit_batch', 2, 1 / 60),
+    'get_dsa_question': _limit('get_dsa_question', 5, 0.2),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+_init_lock = threading.Lock()
+_initialized = False
+_inflight = threading.BoundedSemaphore(MAX_INFLIGHT_REQUESTS)
+
+
+def _connect() -> sqlite3.Connection:
+    global _initialized
+    conn = sqlite3.connect(RATE_LIMIT_DB, timeout=5, isolation_level=None)
+    if not _initialized:
+        with _init_lock:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            _initialized = True
+    return conn
+
+
+def _key_digest(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:32]
+
+
+_key_digests = {_key_digest(key) for key in API_KEYS}
+
+
+def client_id() -> str:
+    """
+    Identify the caller by API key, falling back to the client address
+
+    Only keys listed in API_KEYS count; any other key would let a client get a
+    fresh bucket (and a fresh scheduler tenant) per request.
+    """
+    api_key = request.headers.get('X-API-Key')
+    digest = _key_digest(api_key) if api_key else None
+    if digest in _key_digests:
+        return 'key:' + digest
+    address = request.remote_addr or 'unknown'
+    if TRUST_PROXY and TRUSTED_PROXY_HOPS > 0:
+        # Entries before the ones our proxies appended are whatever the client sent
+        forwarded = [part.strip() for part in request.headers.get('X-Forwarded-For', '').split(',')]
+        if len(forwarded) >= TRUSTED_PROXY_HOPS and forwarded[-TRUSTED_PROXY_HOPS]:
+            address = forwarded[-TRUSTED_PROXY_HOPS]
+    return 'ip:' + address
+
+
+def take_token(key: str, capacity: float, per_second: float) -> float:
+    """
+    Take one token from a bucket
+
+    Returns:
+        float: 0 if a token was taken, otherwise seconds until one is available
+    """
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute('SELECT tokens, updated_at FROM buckets WHERE key = ?', (key,)).fetchone()
+        tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * per_second)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / per_second
+        conn.execute(
+            'INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)',
+            (key, tokens, now)
+        )
+        # Occasionally drop buckets that have long since refilled
+        if random.random() < 0.01:
+            conn.execute('DELETE FROM buckets WHERE updated_at < ?', (now - 3600,))
+        conn.execute('COMMIT')
+        return wait
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+
+def _too_many_requests(message: str, retry_after: float):
+    response = jsonify({
+        'result': 'Failure',
+        'message': message
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def rate_limited(route: str):
+    """
+    Apply the route's per-client token bucket and the worker's in-flight cap
+
+    Requests over either limit are rejected immediately with 429 and a
+    Retry-After header instead of queueing behind the model. Streamed
+    responses keep their in-flight slot until the stream ends.
+    """
+    capacity, per_second = RATE_LIMITS[route]
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not RATE_LIMIT_ENABLED:
+                return view(*args, **kwargs)
+
+            try:
+                wait = take_token(f'{route}:{client_id()}', capacity, per_second)
+            except Exception as e:
+                # Fail open: a broken limiter store shouldn't take the API down
+                print(f"Error checking rate limit: {str(e)}")
+                wait = 0.0
+            if wait > 0:
+                return _too_many_requests('Rate limit exceeded. Please slow down.', wait)
+
+            if not _inflight.acquire(blocking=False):
+                return _too_many_requests('Server is busy. Please retry shortly.', 1)
+            streamed = False
+            try:
+                response = make_response(view(*args, **kwargs))
+                if response.is_streamed:
+                    # Streaming routes do their work as the body is sent, so the slot is
+                    # held until the server closes the response
+                    response.call_on_close(_inflight.release)
+                    streamed = True
+                return response
+            finally:
+                if not streamed:
+                    _inflight.release()
+        return wrapper
+    return decorator
@@ -0,0 +1,194 @@
+import gzip
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Optional, Tuple
+
+import metrics
+
+REPORT_STORE_DIR = os.getenv('REPORT_STORE_DIR', 'reports')
+# 'gzip', or 'zstd' when the zstandard package is installed
+REPORT_COMPRESSION = os.getenv('REPORT_COMPRESSION', 'gzip')
+# Reports not written or re-submitted for this long are deleted (0 keeps them forever)
+REPORT_RETENTION_DAYS = float(os.getenv('REPORT_RETENTION_DAYS', '30'))
+# Oldest reports are deleted once the store grows past this size (0 for no cap)
+REPORT_STORE_MAX_BYTES = int(os.getenv('REPORT_STORE_MAX_BYTES', str(1024 ** 3)))
+REPORT_PRUNE_SECONDS = float(os.getenv('REPORT_PRUNE_SECONDS', '3600'))
+
+_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+_REPORT_ID = re.compile(r'^[0-9a-f]{32}$')
+
+stored_bytes = metrics.counter(
+    'report_store_bytes_total', 'Bytes of reports written to the report store, before and after compression',
+    ('stage',))
+pruned_reports = metrics.counter('report_store_pruned_total', 'Reports deleted from the report store', ('reason',))
+
+_prune_lock = threading.Lock()
+_pruned_at = -float('inf')
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def _encoding() -> str:
+    if REPORT_COMPRESSION == 'zstd' and _zstd() is not None:
+        return 'zstd'
+    return 'gzip'
+
+
+def _path(rid: str, encoding: str) -> str:
+    # Fan out by prefix so no single directory grows too large
+    return os.path.join(REPORT_STORE_DIR, rid[:2], rid + _SUFFIXES[encoding])
+
+
+def report_id(report: str) -> str:
+    """Content address of a report."""
+    return hashlib.sha256(report.encode('utf-8')).hexdigest()[:32]
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'zstd':
+        return _zstd().ZstdCompressor(level=10).compress(data)
+    # A fixed mtime keeps the output identical for identical reports
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'zstd':
+        return _zstd().ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def save(report: str) -> Optional[str]:
+    """
+    Store a report compressed under its content address
+
+    Returns:
+        Optional[str]: The report id, or None if it couldn't be written
+    """
+    rid = report_id(report)
+    _maybe_prune()
+    if _touch(rid):
+        return rid
+    encoding = _encoding()
+    data = report.encode('utf-8')
+    compressed = compress(data, encoding)
+    path = _path(rid, encoding)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(compressed)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError as e:
+        print(f"Error storing report {rid}: {str(e)}")
+        return None
+    stored_bytes.inc(len(data), stage='raw')
+    stored_bytes.inc(len(compressed), stage='compressed')
+    return rid
+
+
+def _touch(rid: str) -> bool:
+    """Mark a stored report as recently used; False if it isn't stored."""
+    for encoding in _SUFFIXES:
+        try:
+            os.utime(_path(rid, encoding))
+            return True
+        except FileNotFoundError:
+            continue
+        except OSError:
+            return True
+    return False
+
+
+def prune(now: Optional[float] = None) -> int:
+    """
+    Delete reports past REPORT_RETENTION_DAYS, then the oldest ones while the
+    store is larger than REPORT_STORE_MAX_BYTES
+
+    Returns:
+        int: Number of reports deleted
+    """
+    now = time.time() if now is None else now
+    expire_before = now - REPORT_RETENTION_DAYS * 86400 if REPORT_RETENTION_DAYS > 0 else None
+    kept, total, deleted = [], 0, 0
+    for root, _, names in os.walk(REPORT_STORE_DIR):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            # Leftover temp files of interrupted writes count as expired after an hour
+            expired = (expire_before is not None and stat.st_mtime < expire_before) or (
+                name.endswith('.tmp') and stat.st_mtime < now - 3600)
+            if expired:
+                deleted += _unlink(path, 'expired')
+            elif not name.endswith('.tmp'):
+                kept.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+    if REPORT_STORE_MAX_BYTES > 0 and total > REPORT_STORE_MAX_BYTES:
+        for _, size, path in sorted(kept):
+            if total <= REPORT_STORE_MAX_BYTES:
+                break
+            deleted += _unlink(path, 'size')
+            total -= size
+    return deleted
+
+
+def _unlink(path: str, reason: str) -> int:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        # Another worker pruned it first
+        return 0
+    pruned_reports.inc(reason=reason)
+    return 1
+
+
+def _prune_in_background():
+    try:
+        prune()
+    except Exception as e:
+        print(f"Error pruning report store: {str(e)}")
+    finally:
+        _prune_lock.release()
+
+
+def _maybe_prune():
+    global _pruned_at
+    if time.monotonic() - _pruned_at < REPORT_PRUNE_SECONDS or not _prune_lock.acquire(blocking=False):
+        return
+    _pruned_at = time.monotonic()
+    threading.Thread(target=_prune_in_background, name='report-prune', daemon=True).start()
+
+
+def load(rid: str) -> Optional[Tuple[bytes, str]]:
+    """
+    Read a stored report without decompressing it
+
+    Returns:
+        Optional[Tuple[bytes, str]]: (compressed bytes, content encoding), or None if unknown
+    """
+    if not _REPORT_ID.match(rid):
+        return None
+    for encoding in _SUFFIXES:
+        try:
+            with open(_path(rid, encoding), 'rb') as file:
+                return file.read(), encoding
+        except FileNotFoundError:
+            continue
+    return None
@@ -0,0 +1,247 @@
+import fcntl
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Optional
+
+import metrics
+
+# Concurrent runs allowed per CPU core
+RUN_SLOTS_PER_CORE = float(os.getenv('RUN_SLOTS_PER_CORE', '1'))
+# Largest fraction of the slots one tenant may hold while others are waiting
+RUN_TENANT_SHARE = float(os.getenv('RUN_TENANT_SHARE', '0.5'))
+# Waiting runs per priority class before new ones are turned away
+RUN_MAX_QUEUE = int(os.getenv('RUN_MAX_QUEUE', '100'))
+RUN_QUEUE_TIMEOUT = float(os.getenv('RUN_QUEUE_TIMEOUT', '5'))
+# Slots are lock files here, shared by every worker on the host
+RUN_SLOT_DIR = os.getenv('RUN_SLOT_DIR', os.path.join(tempfile.gettempdir(), 'gencode-run-slots'))
+# How often waiting runs check for slots freed by other workers
+RUN_SLOT_POLL = float(os.getenv('RUN_SLOT_POLL', '0.05'))
+
+# Served strictly in this order
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+PRIORITIES = (INTERACTIVE, BATCH)
+
+queue_depth = metrics.gauge('run_queue_depth', 'Code runs waiting for a slot', ('priority',))
+queue_wait = metrics.histogram(
+    'run_queue_wait_seconds', 'Time code runs waited for a slot', ('priority',),
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+active_runs = metrics.gauge('runs_active', 'Code runs holding a slot')
+
+
+class SchedulerBusyError(Exception):
+    """Raised when a run can't get a slot: its queue is full or the wait timed out."""
+
+
+class HostSlots:
+    """
+    Run slots shared by every process on the host, one lock file per slot
+
+    A slot is held by an exclusive flock on its file, which the kernel drops
+    if the holding process dies, so slots can't leak.
+    """
+
+    def __init__(self, directory: str, count: int):
+        self.directory = directory
+        self.count = count
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, index: int) -> str:
+        return os.path.join(self.directory, f'slot-{index}.lock')
+
+    def _lock(self, index: int):
+        fd = os.open(self._path(index), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def try_acquire(self):
+        """Take a free slot without waiting; returns its handle or None."""
+        # Start at a random slot so workers don't all contend for the first ones
+        offset = random.randrange(self.count)
+        for i in range(self.count):
+            fd = self._lock((offset + i) % self.count)
+            if fd is not None:
+                return fd
+        return None
+
+    def release(self, fd: int):
+        os.close(fd)
+
+    def in_use(self) -> int:
+        """Slots held by any process on the host right now."""
+        free = 0
+        for index in range(self.count):
+            fd = self._lock(index)
+            if fd is not None:
+                free += 1
+                os.close(fd)
+        return self.count - free
+
+
+class Ticket:
+    """A run's place in the queue, and then its slot."""
+
+    def __init__(self, tenant: str, priority: str):
+        self.tenant = tenant
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.waited = 0.0
+        self.granted = False
+        self.slot = None
+        self._event = threading.Event()
+
+
+class FairScheduler:
+    """
+    Grants a fixed number of run slots across tenants
+
+    Interactive runs always go before batch runs. Within a class, tenants
+    with waiting runs take turns, one run each, so a tenant with many queued
+    runs can't starve the others. A tenant holding `tenant_limit` slots only
+    gets another when no other tenant in the class is waiting.
+
+    With `slots`, each run also has to take one of the host's slots, so
+    `capacity` holds across every worker; ordering and tenant shares apply
+    to the runs queued in this process.
+    """
+
+    def __init__(self, capacity: int, tenant_limit: int, max_queue: int, slots: Optional[HostSlots] = None):
+        self.capacity = capacity
+        self.tenant_limit = tenant_limit
+        self.max_queue = max_queue
+        self.slots = slots
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}  # tenant -> deque of tickets
+        self._depth = Counter()
+        self._running = 0
+        self._running_by_tenant = Counter()
+        self._lock = threading.Lock()
+
+    def _next(self, priority: str, capped: bool):
+        """Pop the next ticket of a priority class in tenant round-robin order, or None."""
+        queue = self._queues[priority]
+        for tenant in list(queue):
+            if capped and self._running_by_tenant[tenant] >= self.tenant_limit:
+                continue
+            tickets = queue.pop(tenant)
+            ticket = tickets.popleft()
+            if tickets:
+                # Back of the line for this tenant's next run
+                queue[tenant] = tickets
+            self._depth[priority] -= 1
+            queue_depth.set(self._depth[priority], priority=priority)
+            return ticket
+        return None
+
+    def _dispatch(self):
+        while self._running < self.capacity and any(self._depth.values()):
+            slot = None
+            if self.slots is not None:
+                slot = self.slots.try_acquire()
+                if slot is None:
+                    break
+            ticket = None
+            for priority in PRIORITIES:
+                # Tenants at their share only get slots nobody else in the class is waiting for
+                ticket = self._next(priority, capped=True) or self._next(priority, capped=False)
+                if ticket is not None:
+                    break
+            if ticket is None:
+                if slot is not None:
+                    self.slots.release(slot)
+                break
+            ticket.slot = slot
+            self._running += 1
+            self._running_by_tenant[ticket.tenant] += 1
+            ticket.granted = True
+            ticket._event.set()
+        active_runs.set(self._running)
+
+    def acquire(self, tenant: str, priority: str = INTERACTIVE, timeout: float = RUN_QUEUE_TIMEOUT) -> Ticket:
+        """
+        Wait for a run slot
+
+        Returns:
+            Ticket: Pass to release() once the run finishes
+
+        Raises:
+            SchedulerBusyError: If the queue is full or no slot frees up within timeout
+        """
+        if priority not in self._queues:
+            raise ValueError(f"Unknown run priority '{priority}'")
+        ticket = Ticket(tenant, priority)
+        with self._lock:
+            if self._depth[priority] >= self.max_queue:
+                raise SchedulerBusyError('Too many runs are waiting. Please retry shortly.')
+            self._queues[priority].setdefault(tenant, deque()).append(ticket)
+            self._depth[priority] += 1
+            queue_depth.set(self._depth[priority], priority=priority)
+            self._dispatch()
+
+        deadline = time.monotonic() + timeout
+        while not ticket._event.wait(min(RUN_SLOT_POLL, max(0.0, deadline - time.monotonic()))):
+            with self._lock:
+                if time.monotonic() < deadline:
+                    # Slots freed by other workers don't wake this one up
+                    if self.slots is not None:
+                        self._dispatch()
+                    continue
+                # A slot may have been granted between the timeout and taking the lock
+                if not ticket.granted:
+                    tickets = self._queues[priority][tenant]
+                    tickets.remove(ticket)
+                    if not tickets:
+                        del self._queues[priority][tenant]
+                    self._depth[priority] -= 1
+                    queue_depth.set(self._depth[priority], priority=priority)
+                    raise SchedulerBusyError('No run slot became free in time. Please retry shortly.')
+            break
+        ticket.waited = time.monotonic() - ticket.enqueued_at
+        queue_wait.observe(ticket.waited, priority=priority)
+        return ticket
+
+    def release(self, ticket: Ticket):
+        with self._lock:
+            if ticket.slot is not None:
+                self.slots.release(ticket.slot)
+                ticket.slot = None
+            self._running -= 1
+            self._running_by_tenant[ticket.tenant] -= 1
+            if not self._running_by_tenant[ticket.tenant]:
+                del self._running_by_tenant[ticket.tenant]
+            self._dispatch()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'capacity': self.capacity,
+                'running': self._running,
+                'running_on_host': self.slots.in_use() if self.slots is not None else self._running,
+                'running_by_tenant': dict(self._running_by_tenant),
+                'waiting': {priority: self._depth[priority] for priority in PRIORITIES},
+            }
+
+
+_capacity = max(1, int((os.cpu_count() or 1) * RUN_SLOTS_PER_CORE))
+_scheduler = FairScheduler(_capacity, max(1, math.ceil(_capacity * RUN_TENANT_SHARE)), RUN_MAX_QUEUE,
+                           HostSlots(RUN_SLOT_DIR, _capacity))
+
+
+def acquire(tenant: str, priority: str = INTERACTIVE, timeout: float = RUN_QUEUE_TIMEOUT) -> Ticket:
+    return _scheduler.acquire(tenant, priority, timeout)
+
+
+def release(ticket: Ticket):
+    _scheduler.release(ticket)
+
+
+def snapshot() -> dict:
+    return _scheduler.snapshot()
@@ -0,0 +1,522 @@
+import codecs
+import ctypes
+import os
+import pwd
+import selectors
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Iterator, List, Optional, Tuple
+
+import metrics
+import prevalidate
+import run_scheduler
+
+# Running user code on this host is opt-in
+LOCAL_EXECUTION_ENABLED = os.getenv('LOCAL_EXECUTION_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+# Unprivileged account runs are switched to; use one that owns nothing else
+RUN_USER = os.getenv('RUN_USER', 'nobody')
+# Interpreter for Python runs; RUN_USER must be able to execute it
+RUN_PYTHON = os.getenv('RUN_PYTHON', sys.executable)
+# Directories covered with an empty tmpfs inside runs, on top of the app, working and temp directories
+RUN_HIDDEN_PATHS = [path.strip() for path in os.getenv('RUN_HIDDEN_PATHS', '').split(',') if path.strip()]
+RUN_TIMEOUT = float(os.getenv('RUN_TIMEOUT', '10'))  # wall clock, in seconds
+RUN_COMPILE_TIMEOUT = float(os.getenv('RUN_COMPILE_TIMEOUT', '30'))
+RUN_CPU_SECONDS = int(os.getenv('RUN_CPU_SECONDS', '5'))
+RUN_MEMORY_MB = int(os.getenv('RUN_MEMORY_MB', '256'))
+RUN_MAX_FILE_BYTES = int(os.getenv('RUN_MAX_FILE_BYTES', str(1024 * 1024)))
+# The run is killed as soon as its output passes either cap
+RUN_MAX_OUTPUT_BYTES = int(os.getenv('RUN_MAX_OUTPUT_BYTES', str(64 * 1024)))
+RUN_MAX_OUTPUT_LINES = int(os.getenv('RUN_MAX_OUTPUT_LINES', '1000'))
+RUN_MAX_INPUT_BYTES = int(os.getenv('RUN_MAX_INPUT_BYTES', str(64 * 1024)))
+# Output kept per stream for non-streaming callers
+RUN_RESULT_BYTES = int(os.getenv('RUN_RESULT_BYTES', str(16 * 1024)))
+# 'auto' puts each run in its own cgroup v2 group when the host allows it,
+# 'off' relies on rlimits alone
+RUN_CGROUPS = os.getenv('RUN_CGROUPS', 'auto')
+RUN_CGROUP_ROOT = os.getenv('RUN_CGROUP_ROOT', '/sys/fs/cgroup/gencode-runs')
+RUN_CPU_QUOTA = float(os.getenv('RUN_CPU_QUOTA', '1'))  # in cores
+RUN_MAX_PIDS = int(os.getenv('RUN_MAX_PIDS', '64'))
+
+_READ_SIZE = 4096
+_CPU_PERIOD = 100000  # microseconds
+_cgroup_root = None  # None until checked, then the root path or ''
+
+# From <sched.h> and <sys/mount.h>
+_CLONE_NEWNS = 0x00020000
+_CLONE_NEWNET = 0x40000000
+_MS_NOSUID = 0x2
+_MS_NODEV = 0x4
+_MS_BIND = 0x1000
+_MS_REC = 0x4000
+_MS_PRIVATE = 0x40000
+_TMPFS_OPTIONS = b'mode=1777,size=64m'
+
+runs = metrics.counter('code_runs_total', 'Local code runs by language and outcome', ('lang', 'outcome'))
+run_duration = metrics.histogram(
+    'code_run_duration_seconds', 'Wall time of local code runs, including compilation', ('lang',),
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+
+# Outcome -> result shown to the user, in the style of compile_code
+RESULTS = {
+    'exit': 'Success',
+    'runtime_error': 'Runtime Error',
+    'compile_error': 'Compilation Error',
+    'timeout': 'Time Limit Exceeded',
+    'output_limit': 'Output Limit Exceeded',
+    'memory_limit': 'Memory Limit Exceeded',
+    'busy': 'Busy',
+}
+
+
+class RingBuffer:
+    """Keeps the last `capacity` bytes written to it."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buffer = bytearray()
+        self.dropped = 0
+
+    def write(self, data: bytes):
+        self._buffer += data
+        excess = len(self._buffer) - self.capacity
+        if excess > 0:
+            del self._buffer[:excess]
+            self.dropped += excess
+
+    def getvalue(self) -> bytes:
+        return bytes(self._buffer)
+
+
+class _Output:
+    """Byte and line totals across both streams of every stage of a run."""
+
+    def __init__(self):
+        self.bytes = 0
+        self.lines = 0
+
+
+def supports(lang: str) -> bool:
+    """Whether the toolchain for a language is installed on this host."""
+    if lang == 'python':
+        return True
+    if lang == 'cpp':
+        return shutil.which(os.getenv('CXX', 'g++')) is not None
+    if lang == 'java':
+        return shutil.which('javac') is not None and shutil.which('java') is not None
+    return False
+
+
+def _commands(code: str, lang: str):
+    """Return (source file, compile command or None, run command, limit address space)."""
+    if lang == 'python':
+        return 'main.py', None, [RUN_PYTHON, '-I', '-u', 'main.py'], True
+    if lang == 'cpp':
+        compiler = shutil.which(os.getenv('CXX', 'g++')) or 'g++'
+        return 'main.cpp', [compiler, '-O2', '-std=c++17', '-o', 'main', 'main.cpp'], ['./main'], True
+    if lang == 'java':
+        name = prevalidate.java_class_name(code)
+        # The JVM reserves far more address space than it uses, so its heap is capped instead
+        return (f'{name}.java', [shutil.which('javac') or 'javac', '-d', '.', f'{name}.java'],
+                ['java', f'-Xmx{RUN_MEMORY_MB}m', '-XX:+UseSerialGC', '-cp', '.', name], False)
+    raise ValueError(f"Unsupported language '{lang}'")
+
+
+def _write(path: str, value: str):
+    with open(path, 'w') as file:
+        file.write(value)
+
+
+def _cgroups_root() -> str:
+    """Create the parent group for runs once; '' if cgroup v2 can't be used here."""
+    global _cgroup_root
+    if _cgroup_root is None:
+        _cgroup_root = ''
+        parent = os.path.dirname(RUN_CGROUP_ROOT)
+        if RUN_CGROUPS != 'off' and os.path.exists(os.path.join(parent, 'cgroup.controllers')):
+            try:
+                os.makedirs(RUN_CGROUP_ROOT, exist_ok=True)
+                _write(os.path.join(RUN_CGROUP_ROOT, 'cgroup.subtree_control'), '+cpu +memory +pids')
+                _cgroup_root = RUN_CGROUP_ROOT
+            except OSError as e:
+                print(f"cgroup v2 unavailable for code runs, using rlimits: {str(e)}")
+    return _cgroup_root
+
+
+class _Cgroup:
+    """A cgroup v2 group holding one run, with CPU, memory and process quotas."""
+
+    def __init__(self, limit_memory: bool):
+        self.path = os.path.join(_cgroups_root(), f'run-{uuid.uuid4().hex[:12]}')
+        os.mkdir(self.path)
+        try:
+            _write(os.path.join(self.path, 'cpu.max'), f'{int(RUN_CPU_QUOTA * _CPU_PERIOD)} {_CPU_PERIOD}')
+            _write(os.path.join(self.path, 'pids.max'), str(RUN_MAX_PIDS))
+            if limit_memory:
+                _write(os.path.join(self.path, 'memory.max'), str(RUN_MEMORY_MB * 1024 * 1024))
+                _write(os.path.join(self.path, 'memory.swap.max'), '0')
+        except OSError:
+            self.remove()
+            raise
+
+    @property
+    def procs(self) -> str:
+        return os.path.join(self.path, 'cgroup.procs')
+
+    def oom_killed(self) -> bool:
+        try:
+            with open(os.path.join(self.path, 'memory.events')) as file:
+                for line in file:
+                    key, _, value = line.partition(' ')
+                    if key == 'oom_kill':
+                        return int(value) > 0
+        except OSError:
+            pass
+        return False
+
+    def remove(self):
+        # Kill anything that escaped the process group, then drop the empty group
+        try:
+            _write(os.path.join(self.path, 'cgroup.kill'), '1')
+        except OSError:
+            pass
+        for _ in range(50):
+            try:
+                os.rmdir(self.path)
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                time.sleep(0.01)
+        print(f"Error removing cgroup {self.path}")
+
+
+def _run_identity() -> Tuple[int, int]:
+    """RUN_USER's uid and gid."""
+    user = pwd.getpwnam(RUN_USER)
+    return user.pw_uid, user.pw_gid
+
+
+def _hidden_paths() -> List[bytes]:
+    """Directories to cover inside a run, deepest first so covering a parent doesn't hide the next mount point."""
+    paths = {os.path.realpath(path) for path in
+             [os.path.dirname(os.path.abspath(__file__)), os.getcwd(), tempfile.gettempdir()] + RUN_HIDDEN_PATHS}
+    return [os.fsencode(path) for path in sorted(paths, key=len, reverse=True)]
+
+
+def _user_tasks(uid: int) -> Optional[int]:
+    """Processes and threads of a user, which is what RLIMIT_NPROC counts; None without /proc."""
+    tasks = 0
+    try:
+        pids = [name for name in os.listdir('/proc') if name.isdigit()]
+    except OSError:
+        return None
+    for pid in pids:
+        try:
+            if os.stat(f'/proc/{pid}').st_uid == uid:
+                tasks += len(os.listdir(f'/proc/{pid}/task'))
+        except OSError:
+            continue
+    return tasks
+
+
+def _limits(cpu_seconds: int, limit_memory: bool, cgroup: Optional[_Cgroup], workdir: Optional[str] = None):
+    """
+    Build the preexec_fn that confines a child process
+
+    With workdir, the child is also isolated: it gets its own network namespace
+    (no interfaces but a down loopback) and mount namespace, where the app,
+    working and temp directories are covered by empty tmpfs mounts and only
+    workdir is mounted back. It then switches to RUN_USER, which can't read
+    the server's files or its /proc entries.
+    """
+    procs = cgroup.procs if cgroup else None
+    identity = _run_identity() if workdir else None
+    # Everything the child needs is looked up here; it only makes system calls
+    libc = ctypes.CDLL(None, use_errno=True) if workdir else None
+    hidden = _hidden_paths() if workdir else []
+    workdir_path = os.fsencode(os.path.realpath(workdir)) if workdir else None
+    # Without a cgroup's pids.max, RLIMIT_NPROC caps forking. It counts every task of the
+    # user, so the run gets RUN_MAX_PIDS on top of what the user already has
+    user_tasks = None if procs else _user_tasks(identity[0] if identity else os.getuid())
+
+    def mount(source: bytes, target: bytes, fstype: Optional[bytes], flags: int, data: Optional[bytes]):
+        if libc.mount(source, target, fstype, ctypes.c_ulong(flags), data) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f'mount {target.decode()}: {os.strerror(errno)}')
+
+    def apply():
+        import resource
+        if procs:
+            # Join the run's cgroup before exec so every descendant is accounted there
+            _write(procs, '0')
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (RUN_MAX_FILE_BYTES, RUN_MAX_FILE_BYTES))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        if limit_memory and not procs:
+            memory = RUN_MEMORY_MB * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+        if user_tasks is not None:
+            nproc = user_tasks + RUN_MAX_PIDS
+            resource.setrlimit(resource.RLIMIT_NPROC, (nproc, nproc))
+        if identity:
+            if libc.unshare(_CLONE_NEWNS | _CLONE_NEWNET) != 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, f'unshare: {os.strerror(errno)}')
+            # Keep the mounts below from propagating back to the host
+            mount(b'none', b'/', None, _MS_REC | _MS_PRIVATE, None)
+            for path in hidden:
+                mount(b'tmpfs', path, b'tmpfs', _MS_NOSUID | _MS_NODEV, _TMPFS_OPTIONS)
+            # The process still sits in the covered workdir, so '.' mounts it back at its own path
+            os.makedirs(workdir_path, exist_ok=True)
+            mount(b'.', workdir_path, None, _MS_BIND, None)
+            os.chdir(workdir_path)
+            os.setgroups([])
+            os.setgid(identity[1])
+            os.setuid(identity[0])
+    return apply
+
+
+def _kill(proc: subprocess.Popen):
+    # The process leads its own session, so this also reaches anything it forked
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    proc.wait()
+
+
+def _capped(chunk: bytes, output: _Output) -> bytes:
+    """Cut a chunk down to what still fits under the byte and line caps."""
+    chunk = chunk[:max(0, RUN_MAX_OUTPUT_BYTES - output.bytes)]
+    lines_left = RUN_MAX_OUTPUT_LINES - output.lines
+    if chunk.count(b'\n') > lines_left:
+        end = -1
+        for _ in range(lines_left):
+            end = chunk.index(b'\n', end + 1)
+        chunk = chunk[:end + 1]
+    return chunk
+
+
+def _pump(proc: subprocess.Popen, deadline: float, output: _Output) -> Iterator[dict]:
+    """
+    Forward stdout and stderr as they're produced, one bounded read at a time
+
+    Returns (via StopIteration) 'timeout' or 'output_limit' if the run has to
+    be killed, else None once both streams are closed.
+    """
+    selector = selectors.DefaultSelector()
+    decoders = {}
+    for name, pipe in (('stdout', proc.stdout), ('stderr', proc.stderr)):
+        selector.register(pipe, selectors.EVENT_READ, name)
+        decoders[name] = codecs.getincrementaldecoder('utf-8')('replace')
+    try:
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return 'timeout'
+            for key, _ in selector.select(timeout=min(remaining, 0.5)):
+                data = os.read(key.fd, _READ_SIZE)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    continue
+                chunk = _capped(data, output)
+                output.bytes += len(chunk)
+                output.lines += chunk.count(b'\n')
+                text = decoders[key.data].decode(chunk)
+                if text:
+                    yield {'event': key.data, 'data': text}
+                if len(chunk) < len(data):
+                    return 'output_limit'
+        return None
+    finally:
+        selector.close()
+
+
+def _execute(command: List[str], workdir: str, stdin_path: str, timeout: float, cpu_seconds: int,
+             limit_memory: bool, output: _Output, cgroup: Optional[_Cgroup] = None):
+    """Run one stage as RUN_USER, yielding its output; returns (kill reason or None, exit code)."""
+    with open(stdin_path, 'rb') as stdin:
+        # The run's temp directory is an empty tmpfs, so it doubles as HOME
+        proc = subprocess.Popen(
+            command, cwd=workdir, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            env={'PATH': os.environ.get('PATH', '/usr/bin:/bin'), 'HOME': tempfile.gettempdir(),
+                 'LANG': 'C.UTF-8'},
+            start_new_session=True, preexec_fn=_limits(cpu_seconds, limit_memory, cgroup, workdir)
+        )
+    deadline = time.monotonic() + timeout
+    try:
+        reason = yield from _pump(proc, deadline, output)
+        if reason is None:
+            try:
+                # Both streams are closed but the process may still be running
+                proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                reason = 'timeout'
+    finally:
+        # Also reached when the client disconnects and the generator is closed
+        if proc.poll() is None:
+            _kill(proc)
+        proc.stdout.close()
+        proc.stderr.close()
+    return reason, proc.returncode
+
+
+def run_code(code: str, lang: str, stdin: str = '', tenant: str = 'anonymous',
+             priority: str = run_scheduler.INTERACTIVE) -> Iterator[dict]:
+    """
+    Compile and run code locally, streaming its output
+
+    Output is read in fixed-size chunks and forwarded straight away, so memory
+    per run doesn't grow with the program's output; the run is killed once it
+    passes RUN_MAX_OUTPUT_BYTES or RUN_MAX_OUTPUT_LINES.
+
+    Args:
+        code (str): Source code
+        lang (str): 'python', 'cpp' or 'java'
+        stdin (str): Input fed to the program
+        tenant (str): Who the run is accounted to for fair scheduling
+        priority (str): run_scheduler.INTERACTIVE or run_scheduler.BATCH
+
+    Yields:
+        dict: {'event': 'stdout' | 'stderr', 'data': ...} chunks, then one
+        {'event': 'exit', 'result': ..., ...} summary
+    """
+    source, compile_command, run_command, limit_memory = _commands(code, lang)
+    started = time.monotonic()
+    output = _Output()
+    reason, exit_code, ticket = None, None, None
+    try:
+        ticket = run_scheduler.acquire(tenant, priority)
+    except run_scheduler.SchedulerBusyError:
+        reason = 'busy'
+    else:
+        workdir = tempfile.mkdtemp(prefix='run-')
+        cgroup = None
+        try:
+            with open(os.path.join(workdir, source), 'w') as file:
+                file.write(code)
+            stdin_path = os.path.join(workdir, 'input.txt')
+            with open(stdin_path, 'w') as file:
+                file.write(stdin)
+            # The compiler writes its output here as RUN_USER
+            os.chown(workdir, *_run_identity())
+
+            # The compiler's diagnostics are sent back, so it must not read local files either
+            include_error = prevalidate.include_error(code) if lang == 'cpp' else None
+            if include_error:
+                reason = 'compile_error'
+                message = include_error + '\n'
+                output.bytes += len(message)
+                output.lines += 1
+                yield {'event': 'stderr', 'data': message}
+            elif compile_command:
+                reason, exit_code = yield from _execute(
+                    compile_command, workdir, os.devnull, RUN_COMPILE_TIMEOUT, int(RUN_COMPILE_TIMEOUT),
+                    False, output)
+                if reason is None and exit_code != 0:
+                    reason = 'compile_error'
+            if reason is None:
+                # The compiler runs outside the quota group; only the program is held to it
+                if _cgroups_root():
+                    try:
+                        cgroup = _Cgroup(limit_memory)
+                    except OSError as e:
+                        print(f"Error creating cgroup for run, using rlimits: {str(e)}")
+                reason, exit_code = yield from _execute(
+                    run_command, workdir, stdin_path, RUN_TIMEOUT, RUN_CPU_SECONDS, limit_memory, output,
+                    cgroup)
+                if reason is None:
+                    if exit_code == 0:
+                        reason = 'exit'
+                    elif exit_code == -signal.SIGXCPU:
+                        reason = 'timeout'
+                    elif cgroup and cgroup.oom_killed():
+                        reason = 'memory_limit'
+                    else:
+                        reason = 'runtime_error'
+        finally:
+            if cgroup:
+                cgroup.remove()
+            run_scheduler.release(ticket)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    duration = time.monotonic() - started
+    runs.inc(lang=lang, outcome=reason)
+    run_duration.observe(duration, lang=lang)
+    yield {
+        'event': 'exit',
+        'result': RESULTS[reason],
+        'exit_code': exit_code,
+        'duration_seconds': round(duration, 3),
+        'queued_seconds': round(ticket.waited, 3) if ticket else None,
+        'output_bytes': output.bytes,
+        'output_lines': output.lines,
+        'truncated': reason == 'output_limit',
+    }
+
+
+def run_to_completion(code: str, lang: str, stdin: str = '', tenant: str = 'anonymous',
+                      priority: str = run_scheduler.INTERACTIVE) -> dict:
+    """
+    Run code locally and return its result in one response
+
+    Only the last RUN_RESULT_BYTES of each stream are kept.
+
+    Returns:
+        dict: The exit summary with 'stdout' and 'stderr' added
+    """
+    streams = {'stdout': RingBuffer(RUN_RESULT_BYTES), 'stderr': RingBuffer(RUN_RESULT_BYTES)}
+    summary: Optional[dict] = None
+    for event in run_code(code, lang, stdin, tenant, priority):
+        if event['event'] == 'exit':
+            summary = event
+        else:
+            streams[event['event']].write(event['data'].encode('utf-8'))
+    summary = dict(summary)
+    del summary['event']
+    for name, buffer in streams.items():
+        summary[name] = buffer.getvalue().decode('utf-8', 'replace')
+        if buffer.dropped:
+            summary['truncated'] = True
+    return summary
+
+
+def _isolation_problem() -> str:
+    """Why runs can't be isolated on this host, or '' if a test run succeeds."""
+    if os.geteuid() != 0:
+        return 'the server must run as root to switch runs to RUN_USER and give them their own namespaces'
+    try:
+        uid, _ = _run_identity()
+    except KeyError:
+        return f"RUN_USER '{RUN_USER}' does not exist"
+    if uid == 0:
+        return 'RUN_USER must not be root'
+    workdir = tempfile.mkdtemp(prefix='run-')
+    try:
+        _write(os.path.join(workdir, 'main.py'), 'pass\n')
+        os.chown(workdir, *_run_identity())
+        proc = subprocess.run(
+            [RUN_PYTHON, '-I', 'main.py'], cwd=workdir, capture_output=True, timeout=30,
+            env={'PATH': os.environ.get('PATH', '/usr/bin:/bin'), 'LANG': 'C.UTF-8'},
+            preexec_fn=_limits(30, False, None, workdir)
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        return f'a test run of {RUN_PYTHON} as {RUN_USER} failed: {str(e)}'
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if proc.returncode != 0:
+        return f"a test run of {RUN_PYTHON} as {RUN_USER} failed: {proc.stderr.decode('utf-8', 'replace').strip()}"
+    return ''
+
+
+# Without isolation a run could read the server's environment and files, so none are allowed
+if LOCAL_EXECUTION_ENABLED:
+    _problem = _isolation_problem()
+    if _problem:
+        print(f"Local execution disabled: {_problem}")
+        LOCAL_EXECUTION_ENABLED = False
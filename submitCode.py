@@ -1,6 +1,113 @@
-from config import llm
+from typing import Optional
 
-def submit_code(actualSolution: str, description: str, typedSolution: str, typedLanguage: str) -> dict:
+import llm_client
+import prevalidate
+import prompt_builder
+import report_store
+import tracing
+
+def determine_status(evaluation: str) -> str:
+    """Derive the submission status from the model's evaluation report."""
+    status = 'Not Accepted'
+    
+    # Extract test case data from the table
+    test_case_data = {}
+    try:
+        # Parse test case table
+        if '<table' in evaluation and '</table>' in evaluation:
+            table_sections = evaluation.split('<table')
+            for section in table_sections[1:]:  # Skip the first split which is before any table
+                if '</table>' in section:
+                    table_content = '<table' + section.split('</table>')[0] + '</table>'
+                    
+                    # Check if this is the test case table (contains TC01, TC02, etc.)
+                    if 'TC0' in table_content and ('✅' in table_content or '❌' in table_content):
+                        # Count passes and failures
+                        passed_tests = table_content.count('✅')
+                        failed_tests = table_content.count('❌')
+                        total_tests = passed_tests + failed_tests
+                        
+                        if total_tests > 0:
+                            test_case_data['passed'] = passed_tests
+                            test_case_data['failed'] = failed_tests
+                            test_case_data['total'] = total_tests
+                            test_case_data['pass_rate'] = (passed_tests / total_tests) * 100
+                            break  # Found the test case table, no need to continue
+    except Exception:
+        # If parsing fails, we'll fall back to simpler methods
+        pass
+    
+    # First check for critical failure indicators
+    if '#NO ACTUAL LOGIC FOUND' in evaluation:
+        status = 'Not Accepted'
+    else:
+        # Check if we have test case data
+        if test_case_data and 'pass_rate' in test_case_data:
+            pass_rate = test_case_data['pass_rate']
+            
+            # Determine status based on test case pass rate
+            if pass_rate == 100:  # All tests passed
+                status = 'Accepted'
+            elif pass_rate >= 70:  # Most tests passed
+                status = 'Partially Accepted'
+            elif pass_rate > 0:   # Some tests passed
+                status = 'Partially Accepted'
+            else:  # No tests passed
+                status = 'Not Accepted'
+        else:
+            # Fallback to Code Score if available
+            if 'Code Score' in evaluation:
+                try:
+                    score_text = evaluation.split('Code Score:')[1].split('[')[1].split(']')[0]
+                    if '/' in score_text:
+                        x, n = map(int, score_text.split('/'))
+                        score_percentage = (x / n) * 100
+                        
+                        # Determine status based on score percentage
+                        if score_percentage >= 90:
+                            status = 'Accepted'
+                        elif score_percentage >= 50:
+                            status = 'Partially Accepted'
+                        else:
+                            status = 'Not Accepted'
+                except (IndexError, ValueError):
+                    # If we can't parse the score, use simpler methods
+                    pass
+            
+            # If still not determined, use simpler methods
+            if status == 'Not Accepted':
+                # Count test case symbols throughout the evaluation
+                passed_tests = evaluation.count('✅')
+                failed_tests = evaluation.count('❌')
+                
+                if passed_tests > 0 and failed_tests == 0:
+                    status = 'Accepted'
+                elif passed_tests > 0 and failed_tests > 0:
+                    # Some tests passed but not all
+                    if passed_tests > failed_tests:
+                        status = 'Partially Accepted'
+                    else:
+                        status = 'Not Accepted'
+        
+        # Additional keyword analysis
+        positive_indicators = ['correct solution', 'perfect solution', 'optimal solution', 'all test cases pass']
+        negative_indicators = ['incorrect solution', 'fails', 'error', 'wrong approach', 'time limit exceeded']
+        
+        # Check for positive indicators
+        if any(indicator.lower() in evaluation.lower() for indicator in positive_indicators):
+            if status == 'Not Accepted':  # Don't downgrade from better statuses
+                status = 'Partially Accepted'
+        
+        # Check for negative indicators that would override
+        if any(indicator.lower() in evaluation.lower() for indicator in negative_indicators):
+            if status == 'Accepted':  # Only downgrade from Accepted
+                status = 'Partially Accepted'
+
+    return status
+
+
+def submit_code(actualSolution: str, description: str, typedSolution: str, typedLanguage: str,
+                raise_errors: bool = False, referenceLanguage: Optional[str] = None) -> dict:
     # Check if the typed solution is empty
     if not typedSolution or typedSolution.strip() == '':
         return {
@@ -17,6 +124,30 @@ def submit_code(actualSolution: str, description: str, typedSolution: str, typed
             'status': 'Not Accepted'
         }
 
+    # Reject code that doesn't compile before spending a model call on it
+    outcome, diagnostics = prevalidate.check_syntax(typedSolution, typedLanguage)
+    if outcome == prevalidate.FAILED:
+        return {
+            'markdown_report': f"""
+## ❌ Compilation Error
+
+**Your solution does not compile:**
+```
+{diagnostics}
+```
+- Fix the errors above and submit again
+- Use the Run button to check your code before submitting
+
+*Tip: Compile early, compile often!* 🛠️
+""",
+            'status': 'Not Accepted'
+        }
+
+    # Compact the prompt fields; raises PromptTooLargeError if they can't fit the budget
+    description, actualSolution, typedSolution = prompt_builder.build_submit_inputs(
+        description, actualSolution, typedSolution, typedLanguage, referenceLanguage
+    )
+
     try:
         # Construct a detailed prompt for evaluating the typed solution
         validation_prompt = f"""
@@ -233,7 +364,7 @@ Summary should be in tabular form based on values of above table.
         """
 
         # Use the LLM to generate evaluation
-        evaluation = llm.invoke(validation_prompt).content
+        evaluation = llm_client.invoke('submit', validation_prompt).content
 
         # Format the markdown report with enhanced styling
         markdown_report = f"""
@@ -255,107 +386,20 @@ Summary should be in tabular form based on values of above table.
         """
         
         # Determine solution status based on evaluation content
-        status = 'Not Accepted'
-        
-        # Extract test case data from the table
-        test_case_data = {}
-        try:
-            # Parse test case table
-            if '<table' in evaluation and '</table>' in evaluation:
-                table_sections = evaluation.split('<table')
-                for section in table_sections[1:]:  # Skip the first split which is before any table
-                    if '</table>' in section:
-                        table_content = '<table' + section.split('</table>')[0] + '</table>'
-                        
-                        # Check if this is the test case table (contains TC01, TC02, etc.)
-                        if 'TC0' in table_content and ('✅' in table_content or '❌' in table_content):
-                            # Count passes and failures
-                            passed_tests = table_content.count('✅')
-                            failed_tests = table_content.count('❌')
-                            total_tests = passed_tests + failed_tests
-                            
-                            if total_tests > 0:
-                                test_case_data['passed'] = passed_tests
-                                test_case_data['failed'] = failed_tests
-                                test_case_data['total'] = total_tests
-                                test_case_data['pass_rate'] = (passed_tests / total_tests) * 100
-                                break  # Found the test case table, no need to continue
-        except Exception:
-            # If parsing fails, we'll fall back to simpler methods
-            pass
-        
-        # First check for critical failure indicators
-        if '#NO ACTUAL LOGIC FOUND' in evaluation:
-            status = 'Not Accepted'
-        else:
-            # Check if we have test case data
-            if test_case_data and 'pass_rate' in test_case_data:
-                pass_rate = test_case_data['pass_rate']
-                
-                # Determine status based on test case pass rate
-                if pass_rate == 100:  # All tests passed
-                    status = 'Accepted'
-                elif pass_rate >= 70:  # Most tests passed
-                    status = 'Partially Accepted'
-                elif pass_rate > 0:   # Some tests passed
-                    status = 'Partially Accepted'
-                else:  # No tests passed
-                    status = 'Not Accepted'
-            else:
-                # Fallback to Code Score if available
-                if 'Code Score' in evaluation:
-                    try:
-                        score_text = evaluation.split('Code Score:')[1].split('[')[1].split(']')[0]
-                        if '/' in score_text:
-                            x, n = map(int, score_text.split('/'))
-                            score_percentage = (x / n) * 100
-                            
-                            # Determine status based on score percentage
-                            if score_percentage >= 90:
-                                status = 'Accepted'
-                            elif score_percentage >= 50:
-                                status = 'Partially Accepted'
-                            else:
-                                status = 'Not Accepted'
-                    except (IndexError, ValueError):
-                        # If we can't parse the score, use simpler methods
-                        pass
-                
-                # If still not determined, use simpler methods
-                if status == 'Not Accepted':
-                    # Count test case symbols throughout the evaluation
-                    passed_tests = evaluation.count('✅')
-                    failed_tests = evaluation.count('❌')
-                    
-                    if passed_tests > 0 and failed_tests == 0:
-                        status = 'Accepted'
-                    elif passed_tests > 0 and failed_tests > 0:
-                        # Some tests passed but not all
-                        if passed_tests > failed_tests:
-                            status = 'Partially Accepted'
-                        else:
-                            status = 'Not Accepted'
-            
-            # Additional keyword analysis
-            positive_indicators = ['correct solution', 'perfect solution', 'optimal solution', 'all test cases pass']
-            negative_indicators = ['incorrect solution', 'fails', 'error', 'wrong approach', 'time limit exceeded']
-            
-            # Check for positive indicators
-            if any(indicator.lower() in evaluation.lower() for indicator in positive_indicators):
-                if status == 'Not Accepted':  # Don't downgrade from better statuses
-                    status = 'Partially Accepted'
-            
-            # Check for negative indicators that would override
-            if any(indicator.lower() in evaluation.lower() for indicator in negative_indicators):
-                if status == 'Accepted':  # Only downgrade from Accepted
-                    status = 'Partially Accepted'
-        
+        with tracing.span('submission.parse'):
+            status = determine_status(evaluation)
+
         return {
             'markdown_report': markdown_report,
-            'status': status
+            'status': status,
+            # Lets clients fetch the report again from /reports/<id> without resubmitting
+            'report_id': report_store.save(markdown_report)
         }
 
     except Exception as e:
+        # Job workers re-raise so the queue can retry the evaluation
+        if raise_errors:
+            raise
         return {
             'markdown_report': f"""
 ## ❌ Submission Error
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# Tests import the app's modules straight from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep module-level state files out of the working tree
+_workdir = tempfile.mkdtemp(prefix='gencode-tests-')
+os.environ.setdefault('METRICS_MULTIPROCESS', 'false')
+os.environ.setdefault('RATE_LIMIT_DB', os.path.join(_workdir, 'ratelimit.db'))
+os.environ.setdefault('QUESTION_STORE_DB', os.path.join(_workdir, 'questions.db'))
+os.environ.setdefault('RUN_SLOT_DIR', os.path.join(_workdir, 'run-slots'))
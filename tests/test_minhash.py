@@ -0,0 +1,39 @@
+import random
+
+from minhash import MinHasher, shingles, similarity
+
+
+def _text(rng, words):
+    return ' '.join(f'w{rng.randrange(2000)}' for _ in range(words))
+
+
+def test_signatures_are_deterministic_and_full_length():
+    hasher = MinHasher(64)
+    signature = hasher.signature('return the indices of the two numbers that add up to target')
+    assert len(signature) == 64
+    assert MinHasher(64).signature('return the indices of the two numbers that add up to target') == signature
+
+
+def test_text_without_words_has_no_signature():
+    assert MinHasher(64).signature('  ... !!') is None
+
+
+def test_short_texts_fill_every_position():
+    assert None not in MinHasher(64).signature('one two three four')
+
+
+def test_similarity_estimates_jaccard():
+    hasher = MinHasher(64)
+    rng = random.Random(7)
+    errors = []
+    for _ in range(200):
+        words = _text(rng, rng.choice((20, 60, 200))).split()
+        changed = list(words)
+        for _ in range(rng.randrange(len(words) // 2 + 1)):
+            changed[rng.randrange(len(words))] = f'x{rng.randrange(2000)}'
+        first, second = shingles(' '.join(words)), shingles(' '.join(changed))
+        jaccard = len(first & second) / len(first | second)
+        estimate = similarity(hasher.signature(' '.join(words)), hasher.signature(' '.join(changed)))
+        errors.append(estimate - jaccard)
+    assert abs(sum(errors) / len(errors)) < 0.02
+    assert max(abs(error) for error in errors) < 0.25
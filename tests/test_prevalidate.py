@@ -0,0 +1,94 @@
+import pytest
+
+from prevalidate import _disallowed_include, _strip_comments
+
+
+@pytest.mark.parametrize('code', [
+    '#include <vector>\nint main() {}',
+    '#include <bits/stdc++.h>\n',
+    '  #  include <unordered_map>\n',
+    '#include <vector> // containers\n',
+    '#include <vector> /* containers */\n',
+    '%:include <map>\n',
+    '#/* note */include <set>\n',
+    'const char *s = "#include \\".env\\"";\n',
+    '// #include ".env"\nint main() {}',
+    '/* #include "/etc/passwd" */\n',
+])
+def test_standard_headers_and_non_directives_are_allowed(code):
+    assert _disallowed_include(code) is None
+
+
+@pytest.mark.parametrize('code', [
+    # Quoted and absolute paths
+    '#include ".env"\n',
+    '#include "serviceAccountKey.json"\n',
+    '#include </etc/passwd>\n',
+    '#include "/proc/self/environ"\n',
+    # Parent directories inside angle brackets
+    '#include <../.env>\n',
+    '#include <bits/../../.env>\n',
+    '#include <./vector>\n',
+    # Header names produced by a macro
+    '#define F ".env"\n#include F\n',
+    '#include MACRO(env)\n',
+    # Other directives that read files
+    '#include_next <vector>\n',
+    '#import "x.h"\n',
+    '#embed ".env"\n',
+    # Digraph and trigraph spellings of '#'
+    '%:include ".env"\n',
+    '??=include ".env"\n',
+    # Line splices
+    '#inc\\\nlude ".env"\n',
+    '#include \\\n".env"\n',
+    '#\\\r\ninclude ".env"\n',
+    # Comments inside the directive
+    '#/* x */include ".env"\n',
+    '# /* x */ include /* y */ ".env"\n',
+    '#/*\n*/include ".env"\n',
+    '/* a */ #include ".env"\n',
+    '#include <vector> ".env"\n',
+    '#include <vector> /* x */ ".env"\n',
+])
+def test_files_outside_the_standard_library_are_rejected(code):
+    assert _disallowed_include(code) is not None
+
+
+def test_comment_start_inside_a_string_does_not_hide_a_directive():
+    code = 'const char *s = "/*";\n#include ".env"\nconst char *t = "*/";\n'
+    assert _disallowed_include(code) is not None
+
+
+def test_line_comments_become_whitespace():
+    assert _strip_comments('int a; // note\nint b;', True) == 'int a;  \nint b;'
+
+
+def test_block_comments_keep_line_breaks_only_when_asked():
+    code = 'a /* x\ny */ b'
+    assert _strip_comments(code, True) == 'a  \n b'
+    assert _strip_comments(code, False) == 'a   b'
+
+
+@pytest.mark.parametrize('literal', [
+    '"// not a comment"',
+    '"/* not a comment */"',
+    "'/'",
+    '"escaped \\" // quote"',
+    'R"(// raw */ text)"',
+    'R"x(a )" // b)x"',
+    'u8R"(/* raw */)"',
+    "L'\\''",
+])
+def test_comment_markers_inside_literals_are_kept(literal):
+    code = f'auto s = {literal};'
+    assert _strip_comments(code, True) == code
+
+
+def test_digit_separators_are_not_char_literals():
+    code = "int n = 1'000'000; // one million\nint m = 0x1'F;"
+    assert _strip_comments(code, True) == "int n = 1'000'000;  \nint m = 0x1'F;"
+
+
+def test_unterminated_literal_stops_at_end_of_line():
+    assert _strip_comments('char c = \'a;\nint b; // x', True) == "char c = 'a;\nint b;  "
@@ -0,0 +1,52 @@
+import pytest
+
+from prompt_builder import _strip_c_comments, build_submit_inputs
+
+
+def test_line_and_block_comments_are_removed():
+    code = 'int a; // note\nint b; /* one */ int c;'
+    assert _strip_c_comments(code) == 'int a; \nint b;   int c;'
+
+
+def test_block_comments_keep_their_line_breaks():
+    assert _strip_c_comments('a /* x\ny\nz */ b') == 'a \n\n b'
+
+
+@pytest.mark.parametrize('literal', [
+    '"// not a comment"',
+    '"/* not a comment */"',
+    "'/'",
+    '"escaped \\" // quote"',
+    "'\\''",
+    'R"(// raw */ text)"',
+    'R"delim(a )" // b)delim"',
+])
+def test_comment_markers_inside_literals_are_kept(literal):
+    code = f'auto s = {literal};'
+    assert _strip_c_comments(code) == code
+
+
+def test_identifier_ending_in_r_is_not_a_raw_string():
+    code = 'FOOR"// x"'
+    assert _strip_c_comments(code) == code
+
+
+def test_comment_after_a_literal_is_removed():
+    assert _strip_c_comments('s = "a//b"; // c') == 's = "a//b"; '
+
+
+def test_digit_separators_are_not_char_literals():
+    code = "int n = 1'000; // one thousand"
+    assert _strip_c_comments(code) == "int n = 1'000; "
+
+
+def test_reference_is_compacted_in_its_own_language():
+    reference = '#include <vector>\nint half(int a) { return a / 2; } // halve\n'
+    _, actual, typed = build_submit_inputs('d', reference, 'x = a // 2  # floor\n', 'python', 'cpp')
+    assert actual == '#include <vector>\nint half(int a) { return a / 2; }'
+    assert typed == 'x = a // 2'
+
+
+def test_reference_of_unknown_language_keeps_its_comments():
+    _, actual, _ = build_submit_inputs('d', 'x = a // 2  # floor\n', 'pass', 'cpp')
+    assert actual == 'x = a // 2  # floor'
@@ -0,0 +1,58 @@
+import pytest
+
+import question_store
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(question_store, 'QUESTION_STORE_DB', str(tmp_path / 'questions.db'))
+    monkeypatch.setattr(question_store, '_initialized', False)
+
+
+def _question(title, description, **fields):
+    return dict({'title': title, 'description': description, 'solution': '// cpp'}, **fields)
+
+
+STATEMENT = ('Given an array of integers nums and an integer target, return the indices of the two '
+             'numbers such that they add up to target. Each input has exactly one solution.')
+
+
+def test_questions_are_returned_with_their_id():
+    qid = question_store.add_question('Arrays', _question('Two Sum', STATEMENT))
+    stored = question_store.get_question(qid)
+    assert stored['title'] == 'Two Sum'
+    assert stored['question_id'] == qid
+    assert question_store.get_question('missing') is None
+
+
+def test_reference_solution_prefers_the_submitted_language():
+    question = _question('Two Sum', STATEMENT, solutions={'cpp': '// cpp', 'python': '# py'})
+    qid = question_store.add_question('Arrays', question)
+    assert question_store.get_reference_solution(qid, 'python') == ('# py', 'python')
+    assert question_store.get_reference_solution(qid, 'java') == ('// cpp', 'cpp')
+    assert question_store.get_reference_solution('missing', 'python') is None
+
+
+def test_oldest_questions_are_evicted(monkeypatch):
+    monkeypatch.setattr(question_store, 'QUESTION_POOL_SIZE', 2)
+    ids = [question_store.add_question('T', _question(f'Q{i}', f'problem number {i} about {i} things'))
+           for i in range(3)]
+    assert question_store.get_question(ids[0]) is None
+    assert question_store.size() == 2
+    assert question_store.topic_counts() == {'T': 2}
+
+
+def test_near_duplicates_are_found():
+    qid = question_store.add_question('Arrays', _question('Two Sum', STATEMENT))
+    reworded = _question('Pair Sum', STATEMENT.replace('exactly one solution', 'exactly one valid solution'))
+    duplicate = question_store.find_duplicate(reworded)
+    assert duplicate is not None and duplicate['question_id'] == qid
+    unrelated = _question('Trees', 'Return the maximum depth of a binary tree given its root node pointer.')
+    assert question_store.find_duplicate(unrelated) is None
+
+
+def test_random_question_prefers_the_topic():
+    question_store.add_question('Arrays', _question('Two Sum', STATEMENT))
+    qid = question_store.add_question('Trees', _question('Depth', 'Return the maximum depth of a binary tree.'))
+    assert question_store.get_random_question('Trees')['question_id'] == qid
+    assert question_store.get_random_question('Graphs') is not None
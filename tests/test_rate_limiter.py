@@ -0,0 +1,38 @@
+import pytest
+
+import rate_limiter
+
+
+@pytest.fixture
+def buckets(tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'RATE_LIMIT_DB', str(tmp_path / 'ratelimit.db'))
+    monkeypatch.setattr(rate_limiter, '_initialized', False)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, 'time', lambda: now[0])
+    return now
+
+
+def test_burst_up_to_capacity_then_wait(buckets, clock):
+    assert [rate_limiter.take_token('k', 3, 0.5) for _ in range(3)] == [0, 0, 0]
+    assert rate_limiter.take_token('k', 3, 0.5) == pytest.approx(2.0)
+
+
+def test_tokens_refill_over_time(buckets, clock):
+    for _ in range(2):
+        rate_limiter.take_token('k', 2, 1)
+    assert rate_limiter.take_token('k', 2, 1) == pytest.approx(1.0)
+    clock[0] += 1.0
+    assert rate_limiter.take_token('k', 2, 1) == 0
+    # Refill never goes past capacity
+    clock[0] += 60
+    assert [rate_limiter.take_token('k', 2, 1) for _ in range(3)][-1] > 0
+
+
+def test_buckets_are_independent(buckets, clock):
+    assert rate_limiter.take_token('a', 1, 0.1) == 0
+    assert rate_limiter.take_token('a', 1, 0.1) > 0
+    assert rate_limiter.take_token('b', 1, 0.1) == 0
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from run_scheduler import BATCH, INTERACTIVE, FairScheduler, HostSlots, SchedulerBusyError
+
+
+def _acquire_in_background(scheduler, granted, tenant, priority=INTERACTIVE):
+    """Queue a run that appends (tenant, priority, ticket) to granted once it gets a slot."""
+    def run():
+        ticket = scheduler.acquire(tenant, priority, timeout=5)
+        granted.append((tenant, priority, ticket))
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out waiting for the scheduler'
+        time.sleep(0.005)
+
+
+def _grant_in_turn(scheduler, holder, requests):
+    """Queue requests behind the held slot, then free one slot at a time; returns the grant order."""
+    granted = []
+    threads = []
+    for tenant, priority in requests:
+        threads.append(_acquire_in_background(scheduler, granted, tenant, priority))
+        _wait_until(lambda: sum(scheduler._depth.values()) == len(threads))
+    ticket = holder
+    for count in range(1, len(requests) + 1):
+        scheduler.release(ticket)
+        _wait_until(lambda: len(granted) == count)
+        ticket = granted[-1][2]
+    scheduler.release(ticket)
+    for thread in threads:
+        thread.join()
+    return [(tenant, priority) for tenant, priority, _ in granted]
+
+
+def test_interactive_runs_go_before_batch_runs():
+    scheduler = FairScheduler(capacity=1, tenant_limit=1, max_queue=10)
+    holder = scheduler.acquire('x', INTERACTIVE, timeout=1)
+    order = _grant_in_turn(scheduler, holder, [('a', BATCH), ('b', INTERACTIVE)])
+    assert order == [('b', INTERACTIVE), ('a', BATCH)]
+
+
+def test_tenants_take_turns():
+    scheduler = FairScheduler(capacity=1, tenant_limit=1, max_queue=10)
+    holder = scheduler.acquire('x', INTERACTIVE, timeout=1)
+    requests = [('a', INTERACTIVE), ('a', INTERACTIVE), ('a', INTERACTIVE), ('b', INTERACTIVE)]
+    order = _grant_in_turn(scheduler, holder, requests)
+    assert [tenant for tenant, _ in order] == ['a', 'b', 'a', 'a']
+
+
+def test_tenant_limit_leaves_slots_for_others():
+    scheduler = FairScheduler(capacity=2, tenant_limit=1, max_queue=10)
+    first = scheduler.acquire('a', INTERACTIVE, timeout=1)
+    second = scheduler.acquire('a', INTERACTIVE, timeout=1)
+    granted = []
+    threads = [_acquire_in_background(scheduler, granted, 'a')]
+    _wait_until(lambda: sum(scheduler._depth.values()) == 1)
+    threads.append(_acquire_in_background(scheduler, granted, 'b'))
+    _wait_until(lambda: sum(scheduler._depth.values()) == 2)
+    # 'a' is over its share, so the freed slot goes to 'b' even though 'a' asked first
+    scheduler.release(first)
+    _wait_until(lambda: len(granted) == 1)
+    assert granted[0][0] == 'b'
+    scheduler.release(second)
+    _wait_until(lambda: len(granted) == 2)
+    for _, _, ticket in granted:
+        scheduler.release(ticket)
+    for thread in threads:
+        thread.join()
+
+
+def test_a_full_queue_is_rejected():
+    scheduler = FairScheduler(capacity=1, tenant_limit=1, max_queue=1)
+    holder = scheduler.acquire('a', INTERACTIVE, timeout=1)
+    granted = []
+    thread = _acquire_in_background(scheduler, granted, 'b')
+    _wait_until(lambda: sum(scheduler._depth.values()) == 1)
+    with pytest.raises(SchedulerBusyError):
+        scheduler.acquire('c', INTERACTIVE, timeout=1)
+    scheduler.release(holder)
+    thread.join()
+    scheduler.release(granted[0][2])
+
+
+def test_waiting_times_out():
+    scheduler = FairScheduler(capacity=1, tenant_limit=1, max_queue=10)
+    holder = scheduler.acquire('a', INTERACTIVE, timeout=1)
+    with pytest.raises(SchedulerBusyError):
+        scheduler.acquire('b', INTERACTIVE, timeout=0.05)
+    assert sum(scheduler._depth.values()) == 0
+    scheduler.release(holder)
+
+
+def test_host_slots_cap_runs_across_schedulers(tmp_path):
+    slots = HostSlots(str(tmp_path / 'slots'), 1)
+    first = FairScheduler(capacity=4, tenant_limit=4, max_queue=10, slots=slots)
+    second = FairScheduler(capacity=4, tenant_limit=4, max_queue=10, slots=slots)
+    ticket = first.acquire('a', INTERACTIVE, timeout=1)
+    assert slots.in_use() == 1
+    with pytest.raises(SchedulerBusyError):
+        second.acquire('b', INTERACTIVE, timeout=0.1)
+    first.release(ticket)
+    ticket = second.acquire('b', INTERACTIVE, timeout=1)
+    second.release(ticket)
+    assert slots.in_use() == 0
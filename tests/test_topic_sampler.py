@@ -0,0 +1,34 @@
+import random
+from collections import Counter
+
+from topic_sampler import AliasTable
+
+
+def _draws(table, count, seed=1):
+    rng = random.Random(seed)
+    return Counter(table.draw(rng) for _ in range(count))
+
+
+def test_draws_follow_the_weights():
+    table = AliasTable(['a', 'b', 'c'], [1, 2, 7])
+    counts = _draws(table, 20000)
+    assert abs(counts['a'] / 20000 - 0.1) < 0.015
+    assert abs(counts['b'] / 20000 - 0.2) < 0.015
+    assert abs(counts['c'] / 20000 - 0.7) < 0.015
+
+
+def test_zero_weight_items_are_never_drawn():
+    table = AliasTable(['a', 'b', 'c'], [0, 3, 1])
+    assert 'a' not in _draws(table, 5000)
+
+
+def test_all_zero_weights_fall_back_to_uniform():
+    table = AliasTable(['a', 'b'], [0, 0])
+    counts = _draws(table, 10000)
+    assert abs(counts['a'] / 10000 - 0.5) < 0.03
+
+
+def test_single_item():
+    table = AliasTable(['only'], [0.25])
+    assert len(table) == 1
+    assert set(_draws(table, 100)) == {'only'}
@@ -1,6 +1,5 @@
 from firebase_service import FirebaseService
 from typing import List, Optional, Tuple
-import random
 
 def get_all_topics() -> List[str]:
     """
@@ -17,7 +16,8 @@ def get_all_topics() -> List[str]:
 
 def get_random_topic() -> Optional[str]:
     """
-    Get a random topic from Firebase
+    Get a random topic from Firebase, weighted by priority, recent serves
+    and question pool coverage
     
     Returns:
         Optional[str]: A random topic name or None if no topics exist
@@ -0,0 +1,153 @@
+import math
+import os
+import random
+import threading
+import time
+from typing import List, Optional, Sequence
+
+import question_store
+
+# How often the topic list and priorities are re-read from Firestore
+TOPIC_REFRESH_SECONDS = float(os.getenv('TOPIC_REFRESH_SECONDS', '60'))
+# Serve counts halve over this many seconds
+TOPIC_SERVE_HALF_LIFE = float(os.getenv('TOPIC_SERVE_HALF_LIFE', '3600'))
+# The alias table is rebuilt after this many serves, or once it's this old
+TOPIC_REBUILD_BATCH = int(os.getenv('TOPIC_REBUILD_BATCH', '32'))
+TOPIC_REBUILD_SECONDS = float(os.getenv('TOPIC_REBUILD_SECONDS', '30'))
+# Weight multiplier for topics with no question in the pool yet
+TOPIC_NEW_BOOST = float(os.getenv('TOPIC_NEW_BOOST', '2'))
+
+
+class AliasTable:
+    """Vose's alias method: O(n) to build, O(1) per weighted draw."""
+
+    def __init__(self, items: Sequence, weights: Sequence[float]):
+        n = len(items)
+        total = sum(weights)
+        if total <= 0:
+            # Nothing has weight left; fall back to a uniform draw
+            weights, total = [1.0] * n, float(n)
+        self.items = list(items)
+        self._prob = [1.0] * n
+        self._alias = list(range(n))
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._prob[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] += scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Anything left over is 1 up to rounding error
+
+    def draw(self, rng=random):
+        i = rng.randrange(len(self.items))
+        return self.items[i] if rng.random() < self._prob[i] else self.items[self._alias[i]]
+
+    def __len__(self):
+        return len(self.items)
+
+
+_priorities = {}  # topic -> admin priority
+_serves = {}  # topic -> (decayed serve count, monotonic time of last update)
+_table: Optional[AliasTable] = None
+_loaded_at = -math.inf
+_built_at = -math.inf
+_pending = 0  # serves since the last rebuild
+_lock = threading.Lock()
+_load_lock = threading.Lock()
+
+
+def _recent_serves(topic: str, now: float) -> float:
+    count, updated = _serves.get(topic, (0.0, now))
+    return count * 0.5 ** ((now - updated) / TOPIC_SERVE_HALF_LIFE)
+
+
+def _weight(topic: str, now: float, pooled: dict) -> float:
+    availability = 1.0 if pooled.get(topic) else TOPIC_NEW_BOOST
+    return _priorities[topic] * availability / (1.0 + _recent_serves(topic, now))
+
+
+def _rebuild(now: float):
+    global _table, _built_at, _pending
+    pooled = question_store.topic_counts()
+    topics = list(_priorities)
+    _table = AliasTable(topics, [_weight(topic, now, pooled) for topic in topics]) if topics else None
+    _built_at = now
+    _pending = 0
+    # Forget serve counts of removed topics
+    for topic in [t for t in _serves if t not in _priorities]:
+        del _serves[topic]
+
+
+def _refresh_topics():
+    """Re-read topics from Firestore when the cached list is stale."""
+    global _priorities, _loaded_at
+    if time.monotonic() - _loaded_at < TOPIC_REFRESH_SECONDS:
+        return
+    # Without a table every caller has to wait; otherwise one refreshes and the rest use the old one
+    if not _load_lock.acquire(blocking=_table is None):
+        return
+    try:
+        if time.monotonic() - _loaded_at < TOPIC_REFRESH_SECONDS:
+            return
+        from firebase_service import FirebaseService
+        try:
+            priorities = FirebaseService.get_topic_priorities()
+        except Exception:
+            if _table is None:
+                raise
+            # Keep serving the cached topics and try again after the next interval
+            _loaded_at = time.monotonic()
+            print("Error refreshing topics; using cached list")
+            return
+        with _lock:
+            _priorities = priorities
+            _loaded_at = time.monotonic()
+            _rebuild(_loaded_at)
+    finally:
+        _load_lock.release()
+
+
+def draw() -> Optional[str]:
+    """
+    Draw a topic weighted by priority, recent serves and pool coverage
+
+    Returns:
+        Optional[str]: A topic name or None if no topics exist
+    """
+    global _pending
+    _refresh_topics()
+    with _lock:
+        now = time.monotonic()
+        if _pending >= TOPIC_REBUILD_BATCH or now - _built_at >= TOPIC_REBUILD_SECONDS:
+            _rebuild(now)
+        if _table is None:
+            return None
+        topic = _table.draw()
+        _serves[topic] = (_recent_serves(topic, now) + 1.0, now)
+        _pending += 1
+    return topic
+
+
+def invalidate():
+    """Re-read topics on the next draw, e.g. after one is added or removed."""
+    global _loaded_at
+    with _lock:
+        _loaded_at = -math.inf
+
+
+def snapshot() -> List[dict]:
+    """Current weight of every topic, heaviest first."""
+    with _lock:
+        now = time.monotonic()
+        pooled = question_store.topic_counts()
+        rows = [{
+            'topic': topic,
+            'priority': priority,
+            'recent_serves': round(_recent_serves(topic, now), 3),
+            'pooled_questions': pooled.get(topic, 0),
+            'weight': round(_weight(topic, now, pooled), 6),
+        } for topic, priority in _priorities.items()]
+    return sorted(rows, key=lambda row: row['weight'], reverse=True)
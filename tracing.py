@@ -0,0 +1,217 @@
+import contextvars
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Where finished traces are exported: 'none', 'console' or 'file'
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'none')
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+# Fraction of traces exported and retained regardless of duration
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.01'))
+# Traces at least this slow are always exported and retained
+TRACE_SLOW_SECONDS = float(os.getenv('TRACE_SLOW_SECONDS', '2'))
+TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '100'))
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_retained = deque(maxlen=TRACE_BUFFER_SIZE)
+_retained_lock = threading.Lock()
+_export_lock = threading.Lock()
+
+
+def _new_id(nbytes: int) -> str:
+    return '%0*x' % (nbytes * 2, random.getrandbits(nbytes * 8))
+
+
+class Trace:
+    """Spans belonging to one request, exported together when the root span ends."""
+
+    def __init__(self, trace_id: str, request_id: str):
+        self.trace_id = trace_id
+        self.request_id = request_id
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span: 'Span'):
+        with self._lock:
+            self.spans.append(span)
+
+
+class Span:
+    """A timed operation, serialized with OpenTelemetry field names."""
+
+    def __init__(self, name: str, trace: Trace, parent_id: Optional[str], attributes: dict):
+        self.name = name
+        self.trace = trace
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.status = 'OK'
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    @property
+    def duration(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e9
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def record_error(self, error: Exception):
+        self.status = 'ERROR'
+        self.attributes['exception.type'] = type(error).__name__
+        self.attributes['exception.message'] = str(error)
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.trace.add(self)
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_id,
+            'start_time_unix_nano': self.start_ns,
+            'end_time_unix_nano': self.end_ns,
+            'duration_ms': round(self.duration * 1000, 3),
+            'status': self.status,
+            'attributes': dict(self.attributes, request_id=self.trace.request_id),
+        }
+
+
+class _NoopSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def record_error(self, error):
+        pass
+
+
+def current_span():
+    return _current_span.get()
+
+
+def current_request_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace.request_id if span else None
+
+
+def start_trace(name: str, request_id: Optional[str] = None, traceparent: Optional[str] = None,
+                **attributes):
+    """
+    Start a root span and make it current
+
+    Args:
+        name (str): Root span name
+        request_id (Optional[str]): Caller supplied request id, generated if missing
+        traceparent (Optional[str]): W3C traceparent header to continue
+
+    Returns:
+        (Span, token): The root span and the token to pass to end_trace
+    """
+    trace_id, parent_id = None, None
+    match = _TRACEPARENT.match(traceparent or '')
+    if match:
+        trace_id, parent_id = match.group(1), match.group(2)
+    trace = Trace(trace_id or _new_id(16), request_id or _new_id(8))
+    root = Span(name, trace, parent_id, attributes)
+    return root, _current_span.set(root)
+
+
+def end_trace(root: Span, token):
+    """End a root span, then export and retain its trace if sampled."""
+    _current_span.reset(token)
+    root.end()
+    slow = root.duration >= TRACE_SLOW_SECONDS
+    if slow or random.random() < TRACE_SAMPLE_RATE:
+        _finish_trace(root, slow)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a stage of the current request as a child span
+
+    Outside a request a new trace is started, so background work is traced too.
+    """
+    if not TRACING_ENABLED:
+        yield _NoopSpan()
+        return
+    parent = _current_span.get()
+    if parent is None:
+        root, token = start_trace(name, **attributes)
+        try:
+            yield root
+        except Exception as e:
+            root.record_error(e)
+            raise
+        finally:
+            end_trace(root, token)
+        return
+
+    child = Span(name, parent.trace, parent.span_id, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+
+def traceparent(span: Span) -> str:
+    return f'00-{span.trace.trace_id}-{span.span_id}-01'
+
+
+def _finish_trace(root: Span, slow: bool):
+    with root.trace._lock:
+        spans = sorted((s.to_dict() for s in root.trace.spans), key=lambda s: s['start_time_unix_nano'])
+    record = {
+        'trace_id': root.trace.trace_id,
+        'request_id': root.trace.request_id,
+        'name': root.name,
+        'duration_ms': round(root.duration * 1000, 3),
+        'slow': slow,
+        'spans': spans,
+    }
+    with _retained_lock:
+        _retained.append(record)
+    _export(record)
+
+
+def _export(record: dict):
+    if TRACE_EXPORTER == 'console':
+        print(json.dumps(record))
+    elif TRACE_EXPORTER == 'file':
+        try:
+            with _export_lock, open(TRACE_FILE, 'a') as file:
+                file.write(json.dumps(record) + '\n')
+        except Exception as e:
+            print(f"Error exporting trace: {str(e)}")
+
+
+def retained_traces() -> list:
+    """Retained traces, newest first."""
+    with _retained_lock:
+        return list(reversed(_retained))
+
+
+def get_retained_trace(trace_id: str) -> Optional[dict]:
+    with _retained_lock:
+        for record in _retained:
+            if record['trace_id'] == trace_id:
+                return record
+    return None
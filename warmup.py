@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from config import LLM_ROUTES
+
+# 'background' warms clients in a thread after boot, 'eager' before serving,
+# 'off' leaves everything to the first request that needs it
+WARMUP_MODE = os.getenv('WARMUP_MODE', 'background')
+
+_stages = OrderedDict()  # stage name -> {'seconds': ..., 'error': ...}
+_lock = threading.Lock()
+_status = 'pending'
+
+
+def record_stage(name: str, seconds: float, error: str = None):
+    with _lock:
+        _stages[name] = {'seconds': round(seconds, 4), 'error': error}
+
+
+def _timed(name: str, fn):
+    start = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        record_stage(name, time.perf_counter() - start, str(e))
+    else:
+        record_stage(name, time.perf_counter() - start)
+
+
+def _import_langchain():
+    if any(route['provider'] == 'gemini' for route in LLM_ROUTES.values()):
+        import langchain_google_genai  # noqa: F401
+
+
+def _build_llm_clients():
+    from llm_provider import get_llm
+    for call_site in LLM_ROUTES:
+        get_llm(call_site)
+
+
+def _import_firebase():
+    import firebase_admin  # noqa: F401
+    from firebase_admin import firestore  # noqa: F401
+
+
+def _connect_firestore():
+    # A real read opens the gRPC channel so the first request doesn't pay for it
+    from firebase_service import FirebaseService
+    FirebaseService.get_all_topics()
+
+
+def run():
+    """Import heavy dependencies and open client connections, timing each stage."""
+    global _status
+    with _lock:
+        if _status != 'pending':
+            return
+        _status = 'running'
+    _timed('import.langchain_google_genai', _import_langchain)
+    _timed('init.llm_clients', _build_llm_clients)
+    _timed('import.firebase_admin', _import_firebase)
+    _timed('connect.firestore', _connect_firestore)
+    with _lock:
+        _status = 'done'
+
+
+def start():
+    """Warm up according to WARMUP_MODE."""
+    if WARMUP_MODE == 'eager':
+        run()
+    elif WARMUP_MODE == 'background':
+        threading.Thread(target=run, name='warmup', daemon=True).start()
+
+
+def report() -> dict:
+    """Warm-up status and the time spent in each boot and warm-up stage."""
+    with _lock:
+        return {
+            'mode': WARMUP_MODE,
+            'status': _status,
+            'stages': OrderedDict((name, dict(stage)) for name, stage in _stages.items()),
+        }